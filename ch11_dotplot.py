@@ -1,6 +1,19 @@
 """Generate a sequence alignment dot plot"""
 
+import collections
+import queue
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
 from ch11_plot import Plot
+import dotEngine
+import dotProfile
+import dotRaster
+import dotVector
+from dotPoints import (PointSet, Segments, MATCH, GAP_MATCH, INDEL,
+                       REVERSE, CATEGORIES, BOTH_STRANDS, CATEGORY_SLOPES)
 
 class DotPlot(Plot):
 
@@ -31,8 +44,42 @@ class DotPlot(Plot):
     realMatches = 0
     gapMatches = 0
 
+    # compute_points dispatches on the engine parameter to one of these
+    engines = {'reference': 'compute_points_reference',
+               'numpy': 'compute_points_numpy',
+               'seeded': 'compute_points_seeded',
+               'tiled': 'compute_points_tiled',
+               'banded': 'compute_points_banded',
+               'indexed': 'compute_points_indexed',
+               'parallel': 'compute_points_parallel',
+               'packed': 'compute_points_packed',
+               'scored': 'compute_points_scored'}
+
+    # largest window offered by the sweep controls
+    max_sweep_window = 50
+
+    renderers = ('canvas', 'raster', 'tiles')
+    # canvas colour of each point category
+    category_colours = {MATCH: 'black', GAP_MATCH: 'red',
+                        INDEL: 'green', REVERSE: 'blue'}
+    # with progressive, how often the window collects the points the
+    # worker has computed (ms), and how often the raster and tiles
+    # renderers repaint while they arrive (seconds)
+    progress_poll_ms = 50
+    progress_redraw_seconds = 0.5
+    # the tiles renderer's largest view of the plot, and how many
+    # tile images it keeps
+    viewport_width = viewport_height = 800
+    tile_cache_size = 256
+
     def __init__(self, seq1, seq2, seqname1 = '', seqname2='',
                  window=1, threshold=1, with_axes=False, dot_size=1,
+                 engine='numpy', kmer_cap=1000,
+                 tile=dotEngine.TILE, points_filename=None, band=None,
+                 jobs=None, both_strands=False, matrix=dotEngine.MATRIX,
+                 renderer='canvas', png_filename=None,
+                 sweep_controls=False, progressive=False,
+                 on_complete=None,
                  # super parameters:
                  window_title=None,
                  scale=1.0, ps_filename=None, ps_scale = 1.0):
@@ -44,6 +91,31 @@ class DotPlot(Plot):
         self.threshold = threshold
         self.with_axes = with_axes
         self.dot_size = dot_size
+        if engine not in self.engines:
+            raise ValueError('unknown engine: ' + repr(engine))
+        self.engine = engine
+        self.kmer_cap = kmer_cap
+        self.tile = tile
+        self.points_filename = points_filename
+        self.band = band
+        self.jobs = jobs
+        if both_strands and engine not in ('numpy', 'reference'):
+            raise ValueError('both strands need the numpy or reference '
+                             'engine')
+        self.both_strands = both_strands
+        self.matrix = matrix
+        if renderer not in self.renderers:
+            raise ValueError('unknown renderer: ' + repr(renderer))
+        self.renderer = renderer
+        self.png_filename = png_filename
+        self.sweep_controls = sweep_controls
+        if progressive and engine != 'numpy':
+            raise ValueError('progressive drawing needs the numpy engine')
+        self.progressive = progressive
+        self.on_complete = on_complete
+        self.progress = None
+        self.computing = False
+        self.index = None
         self.window_title = window_title
         # calling super init last because it calls some methods
         # that need the fields
@@ -55,30 +127,155 @@ class DotPlot(Plot):
                                              self.title_font_size))
 
     def setup_data(self):
-        self.points = self.compute_points()
-        self.max_x = max(self.points, key=lambda pt: pt[0])[0]
-        self.max_y = max(self.points, key=lambda pt: pt[1])[1]
+        if self.progressive:
+            # the points are computed once the window is up (see
+            # start_progress), so the plot is laid out for the whole
+            # dot matrix
+            self.set_points(PointSet(BOTH_STRANDS if self.both_strands
+                                     else CATEGORIES))
+            self.max_x = max(len(self.seq1) - self.window, 0)
+            self.max_y = max(len(self.seq2) - self.window, 0)
+            return
+        with dotProfile.stage('points', engine=self.engine) as record:
+            self.set_points(self.compute_points())
+            record['points'] = len(self.points)
+
+    def set_points(self, points):
+        self.points = points
+        self.max_x = self.points.max_x
+        self.max_y = self.points.max_y
+        self.count_points()
+        # the canvas draws diagonal runs of points rather than points
+        self.segments = (Segments.from_points(points)
+                         if self.renderer == 'canvas' else None)
+
+    def count_points(self):
+        self.realMatches = self.points.count(MATCH)
+        self.gapMatches = self.points.count(GAP_MATCH)
+        self.reverseMatches = (self.points.count(REVERSE)
+                               if REVERSE in self.points.categories else 0)
 
     def compute_points(self):
-        pts = []
-        for y in range(1 + len(self.seq2) - self.window):
-            for x in range(1 + len(self.seq1) - self.window):
-                if self.seq2[y] != "-":
-                    if self.test_point(self.seq1, x, self.seq2, y):
-                            pts.append((x, y))
-                            self.realMatches = self.realMatches + 1
+        """Return a PointSet of the plot's points"""
+        return getattr(self, self.engines[self.engine])()
+
+    def compute_points_numpy(self):
+        return dotEngine.window_points(self.seq1, self.seq2,
+                                       self.window, self.threshold,
+                                       both_strands=self.both_strands)
+
+    def compute_points_seeded(self):
+        """Only windows sharing a k-mer seed with seq1 are evaluated,
+        unless seeding would be slow or inexact (k-mers seen more than
+        kmer_cap times in seq1); seed_stats says which happened"""
+        self.seed_stats = {}
+        return dotEngine.seeded_points(self.seq1, self.seq2,
+                                       self.window, self.threshold,
+                                       kmer_cap=self.kmer_cap,
+                                       stats=self.seed_stats)
+
+    def compute_points_tiled(self):
+        """The matrix is computed tile x tile cells at a time; with
+        points_filename the points are written to a MappedPointSet
+        there instead of being kept in memory"""
+        return dotEngine.compute_points(self.seq1, self.seq2,
+                                        self.window, self.threshold,
+                                        'tiled', tile=self.tile,
+                                        points_file=self.points_filename)
+
+    def compute_points_banded(self):
+        """Only diagonals within band of the main diagonal are
+        evaluated (band=None picks it from the longest gap run), and the
+        band is widened where hits are found near its edge"""
+        return dotEngine.banded_points(self.seq1, self.seq2,
+                                       self.window, self.threshold,
+                                       self.band)
+
+    def compute_points_parallel(self):
+        """Chunks of diagonals are computed on jobs processes (default:
+        one per core)"""
+        return dotEngine.parallel_points(self.seq1, self.seq2,
+                                         self.window, self.threshold,
+                                         self.jobs)
+
+    def compute_points_packed(self):
+        """DNA only: the sequences are compared as 2-bit codes plus a
+        '-'/N mask, and the windows counted, 64 positions per word"""
+        return dotEngine.packed_points(self.seq1, self.seq2,
+                                       self.window, self.threshold)
+
+    def compute_points_scored(self):
+        """Windows are kept when their substitution scores under matrix
+        sum to at least threshold (see dotEngine.scored_points)"""
+        return dotEngine.scored_points(self.seq1, self.seq2, self.window,
+                                       self.threshold, self.matrix)
+
+    def compute_points_indexed(self):
+        """The points are answered from the diagonal index, or by
+        window_points when the matrix is too large to index"""
+        index = self.diagonal_index()
+        if index is None:
+            return self.compute_points_numpy()
+        return index.points(self.window, self.threshold)
+
+    def diagonal_index(self):
+        """Return the prefix-sum index of the sequences, building it
+        the first time it is needed, or None when the dot matrix is
+        too large to index"""
+        if self.index is None and dotEngine.DiagonalIndex.fits(
+                len(self.seq1), len(self.seq2)):
+            self.index = dotEngine.DiagonalIndex(self.seq1, self.seq2)
+        return self.index
+
+    def rethreshold(self, window, threshold):
+        """Recompute the points for a new window and threshold from
+        the diagonal index, without recomparing the sequences, and
+        redraw the plot. The scored engine rescores the sequences, and
+        plots too large to index, or with reverse-strand points (which
+        the index does not hold), are recomputed with their engine."""
+        self.stop_progress()
+        self.window = window
+        self.threshold = threshold
+        index = (None if self.engine == 'scored' or self.both_strands
+                 else self.diagonal_index())
+        self.set_points(self.compute_points() if index is None else
+                        index.points(window, threshold))
+        (self.plot_width, self.plot_height,
+         self.plot_left_margin, self.plot_right_margin,
+         self.plot_top_margin, self.plot_bottom_margin) = \
+            self.get_plot_dimensions()
+        self.determine_layout()
+        self.canvas.config(width=self.canvas_width,
+                           height=self.canvas_height)
+        self.canvas.delete('all')
+        self.draw()
+
+    def compute_points_reference(self):
+        """The original cell-by-cell loop, kept to test engines against;
+        a single pass sorts each hit into its category"""
+        pts = PointSet(BOTH_STRANDS if self.both_strands else CATEGORIES)
         for y in range(1 + len(self.seq2) - self.window):
+            on_gap = self.seq2[y] == "-"
             for x in range(1 + len(self.seq1) - self.window):
-                if self.seq2[y] == "-":
-                        if self.test_point(self.seq1, x, self.seq2, y):
-                                pts.append((x, y))
-                                self.gapMatches = self.gapMatches + 1
-        for x in range(1 + len(self.seq2) - self.window):
-            if self.test_pointGap(self.seq1, x, self.seq2, x):
-                    pts.append((x, x))
+                if self.test_point(self.seq1, x, self.seq2, y):
+                    pts.append(GAP_MATCH if on_gap else MATCH, x, y)
+                if x == y and self.test_pointGap(self.seq1, x,
+                                                 self.seq2, y):
+                    pts.append(INDEL, x, y)
+                if self.both_strands and \
+                        self.test_point_reverse(self.seq1, x, self.seq2, y):
+                    pts.append(REVERSE, x, y)
+        return pts
 
+    complement = str.maketrans('ACGTUNacgtun', 'TGCAANtgcaan')
 
-        return pts
+    def test_point_reverse(self, seq1, x, seq2, y):
+        cnt = 0
+        for n in range(self.window):
+            if seq1[x+n] == seq2[y+self.window-1-n].translate(
+                    self.complement):
+                cnt += 1
+        return cnt >= self.threshold
 
     def test_point(self, seq1, x, seq2, y):
         cnt = 0
@@ -94,6 +291,47 @@ class DotPlot(Plot):
                 cnt += 1
         return cnt >= self.threshold
 
+    def create_widgets(self):
+        super().create_widgets()
+        if self.sweep_controls:
+            self.create_sweep_controls()
+        if self.progressive:
+            self.start_progress()
+
+    def create_sweep_controls(self):
+        """Add window and threshold sliders below the canvas"""
+        import tkinter
+        frame = tkinter.Frame(self.root)
+        frame.pack(side='top', fill='x')
+        top = min(self.max_sweep_window, len(self.seq1), len(self.seq2))
+        self.window_scale = tkinter.Scale(frame, label='window',
+                                          from_=1, to=max(top, self.window),
+                                          orient='horizontal')
+        self.window_scale.set(self.window)
+        self.threshold_scale = tkinter.Scale(frame, label='threshold',
+                                             from_=1,
+                                             to=self.max_threshold(
+                                                 self.window),
+                                             orient='horizontal')
+        self.threshold_scale.set(self.threshold)
+        for scale in (self.window_scale, self.threshold_scale):
+            scale.config(command=self.on_sweep)
+            scale.pack(side='left', fill='x', expand=True)
+
+    def max_threshold(self, window):
+        """Return the highest threshold a window can reach"""
+        if self.engine == 'scored':
+            return max(1, int(window * dotEngine.score_table(
+                self.matrix).max()))
+        return window
+
+    def on_sweep(self, value):
+        window = int(self.window_scale.get())
+        self.threshold_scale.config(to=self.max_threshold(window))
+        threshold = int(self.threshold_scale.get())
+        if (window, threshold) != (self.window, self.threshold):
+            self.rethreshold(window, threshold)
+
     def setup_parameters(self):
         super().setup_parameters()
 
@@ -108,9 +346,16 @@ class DotPlot(Plot):
                 self.left_title_margin + self.y_label_width
 
     def get_plot_dimensions(self):
-        return  (round((self.max_x + self.window) * self.scale),
-                 round((self.max_y + self.window) * self.scale) +
-                 self.y_tic_width,
+        self.full_width = round((self.max_x + self.window) * self.scale)
+        self.full_height = (round((self.max_y + self.window) * self.scale) +
+                            self.y_tic_width)
+        if self.renderer == 'tiles':
+            width = min(self.full_width, self.viewport_width)
+            height = min(self.full_height, self.viewport_height)
+        else:
+            width, height = self.full_width, self.full_height
+        return  (width,
+                 height,
                  self.y_label_width,
                  self.ipad_right,
                  5 + self.name_height *
@@ -156,26 +401,288 @@ class DotPlot(Plot):
                            self.y_tic_width)
 
     def draw_plot(self):
-        pointsDrawn = 0
-        for pt in self.points:
-           if pointsDrawn <= self.realMatches:
-                self.draw_oval(
-                    pt[0],
-                    self.plot_height - self.window - pt[1],
-                    pt[0] + self.dot_size - 1,
-                    self.plot_height - self.window - pt[1] - self.dot_size - 1)
-                pointsDrawn = pointsDrawn + 1
-           if self.realMatches < pointsDrawn <= self.realMatches + self.gapMatches:
-                self.draw_oval2(
-                     pt[0],
-                     self.plot_height - self.window - pt[1],
-                     pt[0] + self.dot_size - 1,
-                     self.plot_height - self.window - pt[1] - self.dot_size - 1)
-                pointsDrawn = pointsDrawn + 1
-           if pointsDrawn > self.realMatches + self.gapMatches:
-                self.draw_oval3(
-                     pt[0],
-                     self.plot_height - self.window - pt[1],
-                     pt[0] + self.dot_size - 1,
-                     self.plot_height - self.window - pt[1] - self.dot_size - 1)
-                pointsDrawn = pointsDrawn + 1
+        if self.renderer == 'raster' or self.png_filename:
+            self.rasterize_plot()
+        if self.renderer == 'raster':
+            self.draw_plot_raster()
+        elif self.renderer == 'tiles':
+            self.draw_plot_tiles()
+        else:
+            self.draw_plot_canvas()
+        if self.png_filename and not self.computing:
+            self.write_png()
+
+    def rasterize_plot(self):
+        """Paint the points into self.pixels, one value per plot pixel"""
+        self.pixels = dotRaster.rasterize(self.points,
+                                          self.full_width,
+                                          self.full_height,
+                                          self.scale,
+                                          y_offset=self.window,
+                                          dot_size=self.dot_size)
+
+    def draw_plot_raster(self):
+        import tkinter
+        rgb = dotRaster.colourize(self.pixels)
+        self.photo = tkinter.PhotoImage(master=self.root,
+                                        data=dotRaster.ppm_bytes(rgb))
+        self.draw_image(0, self.plot_height / self.scale, self.photo)
+
+    def draw_plot_tiles(self):
+        """Show the plot through a viewport onto a DensityPyramid of
+        the points: the mouse wheel (or + and -) zooms by powers of two
+        and dragging pans. Only the tiles in view are drawn."""
+        import tkinter
+        self.build_pyramid()
+        if getattr(self, 'view', None):     # redrawn by rethreshold
+            self.view.destroy()
+        self.view = tkinter.Canvas(self.root, width=self.plot_width,
+                                   height=self.plot_height, bd=0,
+                                   highlightthickness=0,
+                                   bg=self.canvas_background)
+        self.canvas.create_window(self.origin_x,
+                                  self.origin_y - self.plot_height,
+                                  window=self.view, anchor='nw')
+        self.view_level = self.pyramid.fit_level(self.plot_width,
+                                                 self.plot_height)
+        self.view_x = self.view_y = 0
+        self.view.bind('<ButtonPress-1>', self.on_pan_start)
+        self.view.bind('<B1-Motion>', self.on_pan)
+        self.view.bind('<MouseWheel>',
+                       lambda e: self.zoom(e.delta > 0, e.x, e.y))
+        self.view.bind('<Button-4>', lambda e: self.zoom(True, e.x, e.y))
+        self.view.bind('<Button-5>', lambda e: self.zoom(False, e.x, e.y))
+        self.root.bind('<plus>', lambda e: self.zoom(True))
+        self.root.bind('<minus>', lambda e: self.zoom(False))
+        self.draw_tiles()
+
+    def build_pyramid(self):
+        self.pyramid = dotRaster.DensityPyramid(self.points,
+                                                self.full_width,
+                                                self.full_height,
+                                                self.scale,
+                                                y_offset=self.window,
+                                                dot_size=self.dot_size)
+        self.tile_photos = collections.OrderedDict()
+
+    def draw_tiles(self):
+        self.view.delete('all')
+        t = self.pyramid.tile
+        rows, cols = self.pyramid.shape(self.view_level)
+        # last rows/columns shown, rounded up to whole tiles
+        end_row = (min(rows, self.view_y + self.plot_height) - 1) // t + 1
+        end_col = (min(cols, self.view_x + self.plot_width) - 1) // t + 1
+        for row in range(self.view_y // t, end_row):
+            for col in range(self.view_x // t, end_col):
+                self.view.create_image(col * t - self.view_x,
+                                       row * t - self.view_y,
+                                       image=self.tile_photo(row, col),
+                                       anchor='nw')
+
+    def tile_photo(self, row, col):
+        """Return the PhotoImage of a tile of the current level,
+        keeping the most recently used ones"""
+        import tkinter
+        key = (self.view_level, row, col)
+        if key in self.tile_photos:
+            self.tile_photos.move_to_end(key)
+        else:
+            rgb = self.pyramid.tile_rgb(*key)
+            self.tile_photos[key] = tkinter.PhotoImage(
+                master=self.root, data=dotRaster.ppm_bytes(rgb))
+            if len(self.tile_photos) > self.tile_cache_size:
+                self.tile_photos.popitem(last=False)
+        return self.tile_photos[key]
+
+    def move_view(self, x, y):
+        """Put the top left corner of the view at cell (x, y) of the
+        current level, keeping the view on the plot, and redraw"""
+        rows, cols = self.pyramid.shape(self.view_level)
+        self.view_x = max(0, min(x, cols - self.plot_width))
+        self.view_y = max(0, min(y, rows - self.plot_height))
+        self.draw_tiles()
+
+    def zoom(self, zoom_in, x=None, y=None):
+        """Zoom in or out one level around view position (x, y),
+        by default the middle of the view"""
+        level = self.view_level + (-1 if zoom_in else 1)
+        if not 0 <= level < len(self.pyramid.levels):
+            return
+        if x is None:
+            x, y = self.plot_width // 2, self.plot_height // 2
+        self.view_level = level
+        if zoom_in:
+            self.move_view((self.view_x + x) * 2 - x,
+                           (self.view_y + y) * 2 - y)
+        else:
+            self.move_view((self.view_x + x) // 2 - x,
+                           (self.view_y + y) // 2 - y)
+
+    def on_pan_start(self, event):
+        self.pan_from = event.x, event.y
+
+    def on_pan(self, event):
+        x0, y0 = self.pan_from
+        self.pan_from = event.x, event.y
+        self.move_view(self.view_x - (event.x - x0),
+                       self.view_y - (event.y - y0))
+
+    def write_png(self):
+        """Write the plot area (points only, no axes or titles) as PNG"""
+        dotRaster.write_png(self.png_filename,
+                            dotRaster.colourize(self.pixels))
+        print('wrote', self.png_filename, file=sys.stderr)
+
+    def write_postscript(self):
+        """Stream the plot to the PostScript file, in colour, rather than
+        serializing the canvas items in grey"""
+        if self.computing:
+            return          # finish_progress writes it
+        dotVector.export(self.ps_filename, self.points, self.window,
+                         self.scale, self.dot_size, self.seqname1,
+                         self.seqname2, self.ps_scale, format='ps')
+
+    def draw_plot_canvas(self):
+        """Draw each diagonal run of points as one line, dot_size wide,
+        centred where the dots of the run would be"""
+        self.draw_segments(self.segments)
+
+    def draw_segments(self, segments):
+        top = self.plot_height - self.window
+        dx = (self.dot_size - 1) / 2
+        dy = (self.dot_size + 1) / 2
+        for x, y, length, cat in segments:
+            end = length - 1
+            self.draw_line(x + dx, top - y - dy,
+                           x + end + dx,
+                           top - (y + CATEGORY_SLOPES[cat] * end) - dy,
+                           self.dot_size, self.category_colours[cat])
+
+## Progressive drawing
+##
+## With progressive, the window comes up with empty axes and the
+## points are computed on a worker thread, in diagonal batches from
+## dotEngine.point_batches, which it puts on a queue. poll_progress,
+## run by Tk every progress_poll_ms, draws the batches that have
+## arrived: the canvas renderer adds their segments, the raster and
+## tiles renderers repaint from all the points so far at most every
+## progress_redraw_seconds. Cancel keeps the points computed so far.
+
+    def start_progress(self):
+        import tkinter
+        from tkinter import ttk
+        self.progress_frame = tkinter.Frame(self.root)
+        self.progress_frame.pack(side='top', fill='x')
+        self.progress_bar = ttk.Progressbar(self.progress_frame,
+                                            maximum=1.0)
+        self.progress_bar.pack(side='left', fill='x', expand=True)
+        self.progress_label = tkinter.Label(self.progress_frame,
+                                            text='computing')
+        self.progress_label.pack(side='left')
+        self.cancel_button = tkinter.Button(self.progress_frame,
+                                            text='Cancel',
+                                            command=self.cancel_progress)
+        self.cancel_button.pack(side='left')
+        progress = self.progress = SimpleNamespace(
+            batches=queue.Queue(), stop=threading.Event())
+        self.computing = True
+        self.progress_redrawn = time.perf_counter()
+
+        def compute():
+            try:
+                for batch in dotEngine.point_batches(
+                        self.seq1, self.seq2, self.window, self.threshold,
+                        self.both_strands, stop=progress.stop):
+                    progress.batches.put(batch)
+            finally:
+                progress.batches.put(None)
+
+        threading.Thread(target=compute, daemon=True).start()
+        self.root.after(self.progress_poll_ms, self.poll_progress, progress)
+
+    def poll_progress(self, progress):
+        """Draw the batches computed since the last poll"""
+        if progress is not self.progress:
+            return                          # stopped by rethreshold
+        finished = False
+        arrived = []
+        while not finished:
+            try:
+                batch = progress.batches.get_nowait()
+            except queue.Empty:
+                break
+            if batch is None:
+                finished = True
+            else:
+                arrived.append(batch)
+        for done, points in arrived:
+            self.add_batch(points)
+        if arrived:
+            self.progress_bar['value'] = done
+            self.progress_label['text'] = '{:.0%}, {} points'.format(
+                done, len(self.points))
+        if finished:
+            self.finish_progress()
+            return
+        now = time.perf_counter()
+        if (arrived and self.renderer != 'canvas' and
+                now - self.progress_redrawn >= self.progress_redraw_seconds):
+            self.refresh_plot()
+            self.progress_redrawn = now
+        self.root.after(self.progress_poll_ms, self.poll_progress, progress)
+
+    def add_batch(self, points):
+        for cat in points.categories:
+            self.points.extend(cat, points.xs(cat), points.ys(cat))
+        self.count_points()
+        if self.renderer == 'canvas':
+            self.draw_segments(Segments.from_points(points))
+        if self.renderer == 'raster' or self.png_filename:
+            dotRaster.rasterize(points, self.full_width, self.full_height,
+                                self.scale, y_offset=self.window,
+                                dot_size=self.dot_size, pixels=self.pixels)
+
+    def refresh_plot(self):
+        """Repaint the raster or tiles plot from the points so far"""
+        if self.renderer == 'raster':
+            self.photo.configure(data=dotRaster.ppm_bytes(
+                dotRaster.colourize(self.pixels)))
+        elif self.renderer == 'tiles':
+            self.build_pyramid()
+            self.draw_tiles()
+
+    def finish_progress(self):
+        """Show the last of the points and write the files that needed
+        all of them"""
+        cancelled = self.progress.stop.is_set()
+        self.progress = None
+        self.computing = False
+        if cancelled:
+            self.cancel_button.destroy()
+            self.progress_label['text'] = 'cancelled, {} points'.format(
+                len(self.points))
+        else:
+            self.progress_frame.destroy()
+        if self.renderer == 'canvas':
+            self.segments = Segments.from_points(self.points)
+        else:
+            self.refresh_plot()
+        if self.png_filename:
+            self.write_png()
+        if self.ps_filename:
+            self.write_postscript()
+        if self.on_complete and not cancelled:
+            self.on_complete(self)
+
+    def cancel_progress(self):
+        if self.progress:
+            self.progress.stop.set()
+            self.cancel_button['state'] = 'disabled'
+
+    def stop_progress(self):
+        """Abandon the computation, leaving its batches undrawn"""
+        if self.progress:
+            self.progress.stop.set()
+            self.progress = None
+            self.computing = False
+            self.progress_frame.destroy()
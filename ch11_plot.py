@@ -12,11 +12,14 @@ try:
 except:
     pass
 
-import tkinter
-from tkinter.font import Font
+# tkinter is imported by the methods that need it, so that subclasses
+# can compute their data without a display
 
 import sys
 
+import dotFonts
+import dotProfile
+
 class SubclassResponsibility(Exception):
     pass
 
@@ -58,6 +61,7 @@ The following adjust the points according to the value of scale:
     def draw_line(self, x1, y1, x2, y2, width=1, fill='black'):
     def draw_oval(self, x1, y1, x2, y2, width=1, fill='black'):
     def draw_rectangle(self, x, y, w, h, fill='black'):
+    def draw_image(self, x, y, image, anchor='nw'):
     def draw_text(self, x, y, text, font, anchor='center', fill='black'):
 
 The following do not adjust the points for scale.
@@ -116,14 +120,34 @@ subclass's definition of create_widgets.
 ## Utility Instance Methods
 
     def findfont(self, faces, sz=11, boldflg=False, italicflg=False):
-        for face in faces:
-            font = Font(root=self.root,
+        """Return a Font of the first of faces Tk has, or None; the
+        family found is remembered across runs (see dotFonts)"""
+        from tkinter.font import Font
+
+        def make_font(face):
+            return Font(root=self.root,
                         family=face,
                         size=sz,
                         weight = 'bold' if boldflg else 'normal',
                         slant = 'italic' if italicflg else 'roman')
+
+        cache = dotFonts.cache()
+        key = cache.key(self.root.tk.call('tk', 'windowingsystem'),
+                        faces, boldflg, italicflg)
+        family = cache.get(key)
+        if family is None:
+            return None
+        if family is not dotFonts.MISSING:
+            font = make_font(family)
+            if family == font.actual('family'):
+                return font
+            cache.forget(key)
+        for face in faces:
+            font = make_font(face)
             if face == font.actual('family'):
+                cache.put(key, face)
                 return font
+        cache.put(key, None)
 
 # Access
     def get_root(self):
@@ -143,6 +167,7 @@ subclass's definition of create_widgets.
         self.fonts = {}
         self.window_title = (windowtitle or
                              self.PlotName + ' ' + self.NextPlotNumber())
+        import tkinter
         self.root = tkinter.Tk()
         self.root.title(self.window_title)
 
@@ -158,14 +183,16 @@ subclass's definition of create_widgets.
 ## Layout Framework
 
     def setup(self):
-        self.setup_fonts()
-        self.setup_data()
-        self.setup_parameters()
-        (self.plot_width, self.plot_height,
-         self.plot_left_margin, self.plot_right_margin,
-         self.plot_top_margin, self.plot_bottom_margin) = \
-            self.get_plot_dimensions()
-        self.determine_layout()
+        with dotProfile.stage('setup'):
+            self.setup_fonts()
+            with dotProfile.stage('setup_data'):
+                self.setup_data()
+            self.setup_parameters()
+            (self.plot_width, self.plot_height,
+             self.plot_left_margin, self.plot_right_margin,
+             self.plot_top_margin, self.plot_bottom_margin) = \
+                self.get_plot_dimensions()
+            self.determine_layout()
 
     def setup_fonts(self):
         self.add_font('x', self.findfont(self.sans_faces,
@@ -202,10 +229,16 @@ subclass's definition of create_widgets.
 ## Drawing Framework
 
     def execute(self):
-        self.create_widgets()
-        self.draw()
-        if self.ps_filename:
-            self.write_postscript()
+        with dotProfile.stage('execute'):
+            with dotProfile.stage('create_widgets'):
+                self.create_widgets()
+            with dotProfile.stage('draw') as record:
+                self.draw()
+                if dotProfile.active:
+                    record['canvas_items'] = len(self.canvas.find_all())
+            if self.ps_filename:
+                with dotProfile.stage('postscript'):
+                    self.write_postscript()
         return self
 
     def close(self):
@@ -218,6 +251,7 @@ subclass's definition of create_widgets.
         self.create_canvas()
 
     def create_canvas(self):
+        import tkinter
         self.canvas = tkinter.Canvas(self.root,
                                      width=self.canvas_width,
                                      height=self.canvas_height,
@@ -334,6 +368,14 @@ subclass's definition of create_widgets.
         y = self.origin_y - y*self.scale
         self.canvas.create_rectangle(x, y, x+w, y-h, fill=fill)
 
+    def draw_image(self, x, y, image, anchor='nw'):
+        """Draw a PhotoImage on canvas relative to canvas origin and scale"""
+        self.canvas.create_image(self.origin_x + round(x*self.scale),
+                                 self.origin_y - round(y*self.scale),
+                                 image=image,
+                                 anchor=anchor,
+                                 )
+
     def draw_text(self, x, y, txt, fontname,
                   anchor='center', fill='black'):
         """Draw text on canvas relative to canvas origin and scale"""
@@ -445,6 +487,7 @@ x   draw_line
 x   draw_line_unscaled
 x   draw_oval
 x   draw_rectangle
+x   draw_image
 x   draw_text
 x   draw_text_unscaled
 
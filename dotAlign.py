@@ -0,0 +1,226 @@
+"""Linear-memory global alignment
+
+pairwise2.align.globalxx enumerates every co-optimal alignment, which
+on repetitive sequences takes exponential time and memory, while the
+pipeline only ever uses the first one. global_align returns a single
+optimal alignment using Hirschberg's divide and conquer: only rows of
+the Needleman-Wunsch score matrix are kept, and each row is computed
+with NumPy. Scoring is linear: match, mismatch and a per-position gap
+score. The defaults (1, 0, 0) score like globalxx.
+"""
+
+import threading
+
+import numpy as np
+
+GAP = ord('-')
+
+GLOBALXX = (1, 0, 0)        # (match, mismatch, gap) used by globalxx
+
+# subproblems up to this many matrix cells are aligned with a full
+# score matrix and a traceback instead of being split further
+FULL_DP_CELLS = 1 << 16
+
+
+def encode(seq):
+    if isinstance(seq, str):
+        seq = seq.encode('latin-1')
+    return np.frombuffer(seq, dtype=np.uint8)
+
+
+def profile(a, b, match, mismatch):
+    """Return {character of a: its substitution scores against b}"""
+    return {ch: np.where(b == ch, match, mismatch) for ch in np.unique(a)}
+
+
+def next_row(row, scores, gaps, gap):
+    """Return the score matrix row after row, for a character whose
+    substitution scores against b are scores.
+
+H[j] = max(H'[j-1] + s(ch, b[j-1]), H'[j] + gap, H[j-1] + gap); the
+last term is a running maximum of H[j] - j*gap, so the whole row is
+computed without a Python loop over b.
+"""
+    best = np.empty_like(row)
+    best[0] = row[0] + gap
+    np.maximum(row[:-1] + scores, row[1:] + gap, out=best[1:])
+    best -= gaps
+    np.maximum.accumulate(best, out=best)
+    best += gaps
+    return best
+
+
+def last_row(a, b, match, mismatch, gap):
+    """Return the last row of the score matrix of a against b"""
+    gaps = gap * np.arange(len(b) + 1, dtype=np.int64)
+    row = gaps.copy()
+    scores = profile(a, b, match, mismatch)
+    for ch in a:
+        row = next_row(row, scores[ch], gaps, gap)
+    return row
+
+
+def full_alignment(a, b, match, mismatch, gap):
+    """Align a small a and b with a full score matrix and traceback;
+    returns the two aligned uint8 arrays"""
+    gaps = gap * np.arange(len(b) + 1, dtype=np.int64)
+    score = np.empty((len(a) + 1, len(b) + 1), dtype=np.int64)
+    score[0] = gaps
+    scores = profile(a, b, match, mismatch)
+    for i, ch in enumerate(a):
+        score[i+1] = next_row(score[i], scores[ch], gaps, gap)
+    # on ties, matches are preferred to gaps and gaps to mismatches,
+    # which with the globalxx scores gives alignments without
+    # mismatches, like globalxx's first alignment
+    outA, outB = [], []
+    i, j = len(a), len(b)
+    while i > 0 or j > 0:
+        same = i > 0 and j > 0 and a[i-1] == b[j-1]
+        if same and score[i, j] == score[i-1, j-1] + match:
+            i -= 1
+            j -= 1
+            outA.append(a[i])
+            outB.append(b[j])
+        elif i > 0 and score[i, j] == score[i-1, j] + gap:
+            i -= 1
+            outA.append(a[i])
+            outB.append(GAP)
+        elif j > 0 and score[i, j] == score[i, j-1] + gap:
+            j -= 1
+            outA.append(GAP)
+            outB.append(b[j])
+        else:
+            i -= 1
+            j -= 1
+            outA.append(a[i])
+            outB.append(b[j])
+    return (np.array(outA[::-1], dtype=np.uint8),
+            np.array(outB[::-1], dtype=np.uint8))
+
+
+def hirschberg(a, b, match, mismatch, gap, piecesA, piecesB):
+    """Append the aligned pieces of a and b to piecesA and piecesB"""
+    if len(a) <= 1 or len(a) * len(b) <= FULL_DP_CELLS:
+        alignedA, alignedB = full_alignment(a, b, match, mismatch, gap)
+        piecesA.append(alignedA)
+        piecesB.append(alignedB)
+        return
+    mid = len(a) // 2
+    left = last_row(a[:mid], b, match, mismatch, gap)
+    right = last_row(a[mid:][::-1], b[::-1], match, mismatch, gap)
+    split = int(np.argmax(left + right[::-1]))
+    hirschberg(a[:mid], b[:split], match, mismatch, gap,
+               piecesA, piecesB)
+    hirschberg(a[mid:], b[split:], match, mismatch, gap,
+               piecesA, piecesB)
+
+
+def alignment_score(alignedA, alignedB, match=1, mismatch=0, gap=0):
+    """Return the score of two aligned uint8 arrays"""
+    gapped = (alignedA == GAP) | (alignedB == GAP)
+    same = (alignedA == alignedB) & ~gapped
+    return int(match * np.count_nonzero(same) +
+               mismatch * np.count_nonzero(~same & ~gapped) +
+               gap * np.count_nonzero(gapped))
+
+
+class Alignment:
+
+    """A pairwise global alignment, kept in memory.
+
+    a and b are the aligned sequences as uint8 arrays with '-' for
+    gaps; alignedA and alignedB give them as strings. score is the
+    alignment score under scoring, a (match, mismatch, gap) tuple.
+    startA and startB are the 0-based positions of the sequences'
+    first residues in the records they were read from (non-zero for a
+    region of a record), so that reports use the records' coordinates.
+    write_report writes the human-readable alignment, wrapped into
+    blocks of width columns; write_report_async does the same on a
+    background thread.
+"""
+
+    def __init__(self, a, b, score, scoring=GLOBALXX,
+                 idA='seqA', idB='seqB', startA=0, startB=0):
+        self.a = a
+        self.b = b
+        self.score = score
+        self.scoring = scoring
+        self.idA = idA
+        self.idB = idB
+        self.startA = startA
+        self.startB = startB
+
+    @property
+    def alignedA(self):
+        return self.a.tobytes().decode('latin-1')
+
+    @property
+    def alignedB(self):
+        return self.b.tobytes().decode('latin-1')
+
+    def __len__(self):
+        return len(self.a)
+
+    def __repr__(self):
+        return '<Alignment {} vs {}, length {}, score {}>'.format(
+            self.idA, self.idB, len(self), self.score)
+
+    def markers(self, start, stop):
+        """Return the match line for columns start to stop as bytes:
+        '|' for a match, '.' for a mismatch, ' ' for a gap"""
+        a, b = self.a[start:stop], self.b[start:stop]
+        line = np.full(len(a), ord('.'), dtype=np.uint8)
+        line[a == b] = ord('|')
+        line[(a == GAP) | (b == GAP)] = ord(' ')
+        return line.tobytes()
+
+    def report_blocks(self, width=60):
+        """Yield the report as bytes, one wrapped block at a time"""
+        label = max(len(self.idA), len(self.idB))
+        digits = len(str(len(self)))
+        posA, posB = self.startA, self.startB
+        for start in range(0, len(self), width):
+            stop = min(start + width, len(self))
+            a, b = self.a[start:stop], self.b[start:stop]
+            endA = posA + int(np.count_nonzero(a != GAP))
+            endB = posB + int(np.count_nonzero(b != GAP))
+            yield b''.join((
+                '{:{}} {:>{}} '.format(self.idA, label, posA + 1,
+                                       digits).encode('latin-1'),
+                a.tobytes(), ' {}\n'.format(endA).encode('latin-1'),
+                b' ' * (label + digits + 2), self.markers(start, stop),
+                b'\n',
+                '{:{}} {:>{}} '.format(self.idB, label, posB + 1,
+                                       digits).encode('latin-1'),
+                b.tobytes(), ' {}\n\n'.format(endB).encode('latin-1')))
+            posA, posB = endA, endB
+        yield '  Score={}\n'.format(self.score).encode('latin-1')
+
+    def write_report(self, filename, width=60):
+        with open(filename, 'wb') as fil:
+            for block in self.report_blocks(width):
+                fil.write(block)
+        return filename
+
+    def write_report_async(self, filename, width=60):
+        """Start writing the report on a thread and return the thread"""
+        thread = threading.Thread(target=self.write_report,
+                                  args=(filename, width),
+                                  name='alignment report')
+        thread.start()
+        return thread
+
+
+def global_align(seqA, seqB, match=1, mismatch=0, gap=0,
+                 idA='seqA', idB='seqB', startA=0, startB=0):
+    """Return an Alignment holding one optimal global alignment of
+    seqA and seqB, computed with memory linear in their lengths"""
+    a, b = encode(seqA), encode(seqB)
+    piecesA, piecesB = [], []
+    hirschberg(a, b, match, mismatch, gap, piecesA, piecesB)
+    alignedA = np.concatenate(piecesA)
+    alignedB = np.concatenate(piecesB)
+    return Alignment(alignedA, alignedB,
+                     alignment_score(alignedA, alignedB,
+                                     match, mismatch, gap),
+                     (match, mismatch, gap), idA, idB, startA, startB)
@@ -0,0 +1,166 @@
+"""All-vs-all dot plots of the records of one or two FASTA files
+
+    python3 dotBatch.py strains.fasta 9 11 7
+    python3 dotBatch.py queries.fasta refs.fasta 9 11 7 --jobs 16
+
+With one FASTA every pair of its records is compared (add --self to
+also compare each record with itself); with two, every record of the
+first is compared with every record of the second. Pairs run on a
+process pool with one worker per core by default, so interpreter and
+Biopython start-up is paid once per worker rather than once per pair.
+The parallel engine then runs each pair on --pair-jobs processes
+(default 1), since the pool already keeps every core busy.
+Each pair gets its own directory under the output directory holding
+the usual alignmentInfo.txt, indelRegions.bed and dotplot.png, and
+summary.tsv lists the alignment score and directory of every pair.
+"""
+
+import argparse
+import itertools
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import dotAlign
+import dotEngine
+import dotPipeline
+from dotPlotter import scoring_arg
+
+OUTDIR = 'dotBatchOut'
+SUMMARY_COLUMNS = ('seqA', 'seqB', 'lengthA', 'lengthB', 'alignScore',
+                   'points', 'directory')
+
+
+def safe_name(name):
+    """Return name with characters unsafe in file names replaced"""
+    return re.sub(r'[^A-Za-z0-9._-]', '_', name) or '_'
+
+
+def pair_directories(pairs):
+    """Return a directory name for each (recordA, recordB) of pairs,
+    idA__idB made safe. Ids can differ only in characters safe_name
+    replaces ('strain|0', 'strain_0') or in case, so a name already
+    taken gets a suffix, __2, __3 and so on, in pair order."""
+    taken = set()
+    names = []
+    for (idA, _), (idB, _) in pairs:
+        name = base = safe_name(idA) + '__' + safe_name(idB)
+        n = 1
+        while name.lower() in taken:
+            n += 1
+            name = '{}__{}'.format(base, n)
+        taken.add(name.lower())
+        names.append(name)
+    return names
+
+
+def schedule_pairs(records1, records2=None, self_pairs=False):
+    """Return the list of (recordA, recordB) pairs to compare"""
+    if records2 is not None:
+        return list(itertools.product(records1, records2))
+    if self_pairs:
+        return list(itertools.combinations_with_replacement(records1, 2))
+    return list(itertools.combinations(records1, 2))
+
+
+def run_pair(recordA, recordB, indel_size, window, threshold, outdir,
+             directory, engine='numpy', kmer_cap=1000,
+             scoring=dotAlign.GLOBALXX, report=True, tile=dotEngine.TILE,
+             band=None, pair_jobs=1, matrix=dotEngine.MATRIX):
+    """Process pool task: run one pair in outdir/directory and return
+    its summary row"""
+    (idA, seqA), (idB, seqB) = recordA, recordB
+    pairdir = os.path.join(outdir, directory)
+    result = dotPipeline.run_pair(idA, seqA, idB, seqB, indel_size,
+                                  window, threshold, pairdir,
+                                  engine, kmer_cap, scoring, report, tile,
+                                  band, jobs=pair_jobs, matrix=matrix)
+    return (idA, idB, len(seqA), len(seqB), result.alignment.score,
+            len(result.points), directory)
+
+
+def write_summary(rows, outdir):
+    filename = os.path.join(outdir, 'summary.tsv')
+    with open(filename, 'w') as fil:
+        fil.write('\t'.join(SUMMARY_COLUMNS) + '\n')
+        fil.writelines('\t'.join(map(str, row)) + '\n' for row in rows)
+    print('wrote', filename)
+    return filename
+
+
+def run(fasta_files, indel_size, window, threshold, outdir=OUTDIR,
+        jobs=None, self_pairs=False, engine='numpy', kmer_cap=1000,
+        scoring=dotAlign.GLOBALXX, report=True, tile=dotEngine.TILE,
+        band=None, pair_jobs=1, matrix=dotEngine.MATRIX):
+    """Compare the requested pairs of records of one or two FASTA files
+    on a pool of jobs processes (default: one per core), each pair on
+    pair_jobs processes with the parallel engine; return the summary
+    rows in pair order"""
+    records = [dotPipeline.read_fasta(fasta) for fasta in fasta_files]
+    pairs = schedule_pairs(*records, self_pairs=self_pairs)
+    directories = pair_directories(pairs)
+    os.makedirs(outdir, exist_ok=True)
+    rows = [None] * len(pairs)
+    jobs = min(jobs or os.cpu_count() or 1, max(1, len(pairs)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_pair, recordA, recordB, indel_size,
+                               window, threshold, outdir, directory,
+                               engine, kmer_cap, scoring, report,
+                               tile, band, pair_jobs, matrix): n
+                   for n, ((recordA, recordB), directory)
+                   in enumerate(zip(pairs, directories))}
+        for future in as_completed(futures):
+            rows[futures[future]] = future.result()
+    write_summary(rows, outdir)
+    return rows
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='dotBatch.py',
+        description='Dot plots of every pair of records of one FASTA '
+                    'file, or of every record of one against another')
+    parser.add_argument('fasta_files', nargs='+', metavar='fasta_file',
+                        help='one or two FASTA files')
+    parser.add_argument('indel_size', type=int,
+                        help='indel size threshold')
+    parser.add_argument('window', type=int, help='window size')
+    parser.add_argument('threshold', type=int, help='count threshold')
+    parser.add_argument('--outdir', default=OUTDIR)
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--pair-jobs', type=int, default=1,
+                        help='processes per pair for the parallel engine '
+                             '(default: 1)')
+    parser.add_argument('--self', dest='self_pairs', action='store_true',
+                        help='also compare each record with itself')
+    parser.add_argument('--engine', default='numpy',
+                        choices=dotEngine.ENGINES)
+    parser.add_argument('--kmer-cap', type=int, default=1000)
+    parser.add_argument('--tile', type=int, default=dotEngine.TILE)
+    parser.add_argument('--band', type=int, default=None)
+    parser.add_argument('--matrix', default=dotEngine.MATRIX,
+                        help='substitution matrix of the scored engine '
+                             '(default: {})'.format(dotEngine.MATRIX))
+    parser.add_argument('--scoring', type=scoring_arg,
+                        default=dotAlign.GLOBALXX,
+                        metavar='MATCH,MISMATCH,GAP',
+                        help='alignment scores (default: 1,0,0 as '
+                             'globalxx)')
+    parser.add_argument('--no-report', dest='report',
+                        action='store_false',
+                        help='do not write alignmentInfo.txt')
+    args = parser.parse_args(argv)
+    if len(args.fasta_files) > 2:
+        parser.error('expected one or two FASTA files')
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    run(args.fasta_files, args.indel_size, args.window, args.threshold,
+        outdir=args.outdir, jobs=args.jobs, self_pairs=args.self_pairs,
+        engine=args.engine, kmer_cap=args.kmer_cap, scoring=args.scoring,
+        report=args.report, tile=args.tile, band=args.band,
+        pair_jobs=args.pair_jobs, matrix=args.matrix)
@@ -0,0 +1,263 @@
+"""Benchmarks of the dotPlotter stages on synthetic sequences
+
+    python3 dotBench.py --sizes 500,1000,2000 --output bench.json
+    python3 dotBench.py --baseline bench.json --output new.json
+
+For each size of the ladder a seeded pair of related sequences is
+generated (DNA or protein, with the given identity and indel rate),
+and each stage is timed on it: the global alignment, the dot plot
+points of each engine, the BED file, the PNG rendering and the vector
+export in each of dotVector's formats (PostScript, SVG and PDF). Every
+stage reports its best wall time over --repeat runs and the peak
+memory allocated during one more, untimed run, as seen by tracemalloc
+(NumPy arrays included), so tracing never slows the timed runs. The
+startup stage is the time a new Python process takes to import
+dotPlotter.py, the fixed cost every run pays. Everything runs
+headless.
+
+The results are written as JSON. Given a baseline file written the
+same way, stages more than --tolerance slower than their baseline are
+reported as regressions and the exit status is 1. The baseline is
+read before anything is run, and --output may not name the same file.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import dotAlign
+import dotEngine
+import dotPipeline
+import dotVector
+
+ALPHABETS = {'dna': 'ACGT',
+             'protein': 'ACDEFGHIKLMNPQRSTVWY'}
+SIZES = (500, 1000, 2000)
+
+
+def random_sequence(rng, length, alphabet):
+    letters = np.frombuffer(alphabet.encode('ascii'), dtype=np.uint8)
+    return rng.choice(letters, length)
+
+
+def mutate(rng, seq, alphabet, identity, indel_rate):
+    """Return a copy of the encoded seq in which a fraction 1 - identity
+    of the positions is substituted and indels start at indel_rate per
+    position, with geometric lengths of mean 3"""
+    seq = seq.copy()
+    letters = np.frombuffer(alphabet.encode('ascii'), dtype=np.uint8)
+    subst = rng.random(len(seq)) >= identity
+    seq[subst] = rng.choice(letters, int(np.count_nonzero(subst)))
+    pieces = []
+    pos = 0
+    for start in np.flatnonzero(rng.random(len(seq)) < indel_rate):
+        if start < pos:
+            continue
+        pieces.append(seq[pos:start])
+        length = int(rng.geometric(1 / 3))
+        if rng.random() < 0.5:
+            pos = start + length                            # deletion
+        else:
+            pieces.append(random_sequence(rng, length, alphabet))
+            pos = start                                     # insertion
+    pieces.append(seq[pos:])
+    return np.concatenate(pieces)
+
+
+def synthetic_pair(length, alphabet='dna', identity=0.9, indel_rate=0.01,
+                   seed=0):
+    """Return two related sequences as strings: a random one of length
+    characters and a mutated copy of it"""
+    rng = np.random.default_rng(seed)
+    letters = ALPHABETS[alphabet]
+    seqA = random_sequence(rng, length, letters)
+    seqB = mutate(rng, seqA, letters, identity, indel_rate)
+    return (seqA.tobytes().decode('ascii'),
+            seqB.tobytes().decode('ascii'))
+
+
+def measure(function, repeat):
+    """Return (best seconds, peak bytes, result) of calling function
+    repeat times, then once more under tracemalloc for the peak alone,
+    since tracing every allocation slows the call down. The stages'
+    progress messages are discarded."""
+    best = result = None
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            result = function()
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak, result
+
+
+def startup_seconds(repeat):
+    """Return the best wall time of a Python process importing
+    dotPlotter, out of repeat runs"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import dotPlotter'],
+                       cwd=here, check=True)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def bench_size(size, alphabet, identity, indel_rate, window, threshold,
+               engines, repeat, seed, workdir):
+    """Return the result rows of every stage for one size"""
+    seqA, seqB = synthetic_pair(size, alphabet, identity, indel_rate, seed)
+    rows = []
+
+    def record(stage, function, **extra):
+        seconds, peak, result = measure(function, repeat)
+        rows.append(dict(stage=stage, size=size, alphabet=alphabet,
+                         seconds=seconds, peak_bytes=peak, **extra))
+        label = ':'.join([stage] + [extra[key] for key in
+                                    ('engine', 'format') if key in extra])
+        print('{:>8} {:<16} {:9.4f}s {:9.1f}MB'.format(
+            size, label, seconds, peak / 1e6), file=sys.stderr)
+        return result
+
+    alignment = record('align',
+                       lambda: dotAlign.global_align(seqA, seqB,
+                                                     idA='seqA',
+                                                     idB='seqB'))
+    points = None
+    for engine in engines:
+        points = record('points',
+                        lambda: dotEngine.compute_points(
+                            alignment.a, alignment.b, window, threshold,
+                            engine),
+                        engine=engine)
+        rows[-1]['points'] = len(points)
+    record('bed', lambda: dotPipeline.write_bed(alignment, 1, workdir))
+    record('render', lambda: dotPipeline.write_png(
+        points, window, os.path.join(workdir, 'dotplot.png')))
+    for format in dotVector.FORMATS:
+        record('vector', lambda: dotPipeline.write_vector(
+            points, window, os.path.join(workdir, 'dotplot.' + format),
+            'seqA', 'seqB'), format=format)
+    return rows
+
+
+def row_key(row):
+    return (row['stage'], row.get('engine'), row.get('format'),
+            row['size'], row['alphabet'])
+
+
+def compare(rows, baseline, tolerance):
+    """Return (row, baseline row) for each row more than tolerance
+    slower than the matching baseline row"""
+    before = {row_key(row): row for row in baseline['results']}
+    return [(row, before[row_key(row)]) for row in rows
+            if row_key(row) in before and
+            row['seconds'] > before[row_key(row)]['seconds'] *
+            (1 + tolerance)]
+
+
+def run(sizes=SIZES, alphabet='dna', identity=0.9, indel_rate=0.01,
+        window=11, threshold=7, engines=('numpy',), repeat=3, seed=0):
+    """Benchmark every stage at every size; returns the report dict"""
+    seconds = startup_seconds(repeat)
+    print('{:>8} {:<16} {:9.4f}s'.format('', 'startup', seconds),
+          file=sys.stderr)
+    rows = [dict(stage='startup', size=0, alphabet=alphabet,
+                 seconds=seconds, peak_bytes=None)]
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            rows += bench_size(size, alphabet, identity, indel_rate,
+                               window, threshold, engines, repeat, seed,
+                               workdir)
+    return {'settings': dict(alphabet=alphabet, identity=identity,
+                             indel_rate=indel_rate, window=window,
+                             threshold=threshold, repeat=repeat,
+                             seed=seed),
+            'machine': dict(python=platform.python_version(),
+                            numpy=np.__version__,
+                            platform=platform.platform()),
+            'results': rows}
+
+
+def int_list(text):
+    try:
+        return [int(size) for size in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected integers separated '
+                                         'by commas')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='dotBench.py',
+        description='Time the dotPlotter stages on synthetic sequences')
+    parser.add_argument('--sizes', type=int_list, default=SIZES,
+                        help='sequence lengths (default: 500,1000,2000)')
+    parser.add_argument('--alphabet', default='dna',
+                        choices=sorted(ALPHABETS))
+    parser.add_argument('--identity', type=float, default=0.9)
+    parser.add_argument('--indel-rate', type=float, default=0.01)
+    parser.add_argument('--window', type=int, default=11)
+    parser.add_argument('--threshold', type=int, default=7)
+    parser.add_argument('--engines', default='numpy',
+                        help='point engines to time, separated by commas')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--baseline',
+                        help='results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown reported as a regression '
+                             '(default: 0.25)')
+    args = parser.parse_args(argv)
+    args.engines = args.engines.split(',')
+    if (args.baseline and os.path.exists(args.output) and
+            os.path.samefile(args.output, args.baseline)):
+        parser.error('--output would overwrite the --baseline file')
+    for engine in args.engines:
+        if engine not in dotEngine.ENGINES:
+            parser.error('unknown engine: ' + engine)
+    if 'packed' in args.engines and args.alphabet != 'dna':
+        parser.error('the packed engine only packs DNA; time it with '
+                     '--alphabet dna, or the scored engine for protein')
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fil:
+            baseline = json.load(fil)
+    report = run(args.sizes, args.alphabet, args.identity,
+                 args.indel_rate, args.window, args.threshold,
+                 args.engines, args.repeat, args.seed)
+    with open(args.output, 'w') as fil:
+        json.dump(report, fil, indent=1)
+    print('wrote', args.output)
+    if baseline is not None:
+        slower = compare(report['results'], baseline, args.tolerance)
+        for row, before in slower:
+            print('regression: {} {} size {}: {:.4f}s, baseline {:.4f}s'
+                  .format(row['stage'],
+                          row.get('engine', row.get('format', '')),
+                          row['size'], row['seconds'], before['seconds']))
+        sys.exit(1 if slower else 0)
@@ -0,0 +1,1064 @@
+"""Vectorized point computation engines for DotPlot
+
+The reference DotPlot.compute_points loop re-scans every window for
+every cell of the dot matrix. The functions here compute the same
+points a diagonal at a time: the two sequences are encoded as uint8
+arrays, the character matches along each diagonal are summed with a
+cumulative sum, and every window count is then a single subtraction.
+"""
+
+import itertools
+import math
+import os
+
+import numpy as np
+
+from dotPoints import (PointSet, MappedPointSet, MATCH, GAP_MATCH, INDEL,
+                       REVERSE, CATEGORIES, BOTH_STRANDS)
+
+GAP = ord('-')
+
+
+def encode_sequence(seq):
+    """Return seq as a uint8 array of its character codes"""
+    if isinstance(seq, np.ndarray):
+        return seq.astype(np.uint8, copy=False)
+    if isinstance(seq, str):
+        seq = seq.encode('latin-1')
+    return np.frombuffer(seq, dtype=np.uint8)
+
+
+COMPLEMENT = bytes.maketrans(b'ACGTUNacgtun', b'TGCAANtgcaan')
+
+
+def reverse_complement(b):
+    """Return the reverse complement of the encoded sequence b; only
+    nucleotide codes are complemented, other characters (gaps, amino
+    acids) are just reversed"""
+    table = np.frombuffer(COMPLEMENT, dtype=np.uint8)
+    return table[b[::-1]]
+
+
+def diagonal_start(offset):
+    """Return the (x, y) start of the diagonal x - y = offset"""
+    return (offset, 0) if offset >= 0 else (0, -offset)
+
+
+def window_sums(hits, window, dtype=np.int32):
+    """Return the sums of every window-long run of hits"""
+    csum = np.zeros(len(hits) + 1, dtype=dtype)
+    np.cumsum(hits, out=csum[1:])
+    return csum[window:] - csum[:-window]
+
+
+def diagonal_window_counts(a, b, offset, window):
+    """Return (x0, y0, counts) for the diagonal x - y = offset of the
+    encoded sequences a and b, where counts[k] is the number of
+    matching characters in the window starting at (x0 + k, y0 + k)"""
+    x0, y0 = diagonal_start(offset)
+    n = min(len(a) - x0, len(b) - y0)
+    if n < window:
+        return x0, y0, np.zeros(0, dtype=np.int32)
+    return x0, y0, window_sums(a[x0:x0+n] == b[y0:y0+n], window)
+
+
+def window_points(seq1, seq2, window, threshold, points=None,
+                  both_strands=False):
+    """Compute the dot plot points of seq1 (x) against seq2 (y).
+
+Each diagonal is visited once and its hits are sorted straight into
+the categories of a PointSet (a new one unless points is given):
+    MATCH         windows with at least threshold identical characters
+                  whose first seq2 character is not a gap
+    GAP_MATCH     the same, but starting on a seq2 gap
+    INDEL         main-diagonal windows with at least threshold
+                  positions where seq1 has a gap and seq2 does not
+and with both_strands:
+    REVERSE       windows with at least threshold characters of seq1
+                  identical to the reverse complement of the seq2
+                  window at the same point
+
+A seq1 window read forwards against a seq2 window read backwards is a
+forward diagonal of seq1 against the reverse complement of seq2, with
+seq2's coordinates mirrored. Both have the same diagonal offsets, so
+each offset is visited once for the two strands.
+"""
+    if points is None:
+        points = PointSet(BOTH_STRANDS if both_strands else CATEGORIES)
+    a = encode_sequence(seq1)
+    b = encode_sequence(seq2)
+    if both_strands:
+        rc = reverse_complement(b)
+        for offset in range(-(len(b) - window), len(a) - window + 1):
+            diagonal_points(a, b, offset, window, threshold, points)
+            reverse_points(a, rc, offset, window, threshold, points)
+    else:
+        match_points(a, b, window, threshold, points)
+    indel_points(a, b, window, threshold, points)
+    return points
+
+
+def reverse_points(a, rc, offset, window, threshold, points):
+    """Add the REVERSE points of the diagonal x - y = offset of a
+    against rc, the reverse complement of the y sequence"""
+    x0, m0, counts = diagonal_window_counts(a, rc, offset, window)
+    k = np.flatnonzero(counts >= threshold).astype(np.int32)
+    points.extend(REVERSE, k + x0, len(rc) - window - m0 - k)
+    return len(k)
+
+
+def match_points(a, b, window, threshold, points, x_offset=0, y_offset=0):
+    """Add the MATCH and GAP_MATCH points of every window of the
+    encoded a and b to points, shifted by (x_offset, y_offset)"""
+    for offset in range(-(len(b) - window), len(a) - window + 1):
+        diagonal_points(a, b, offset, window, threshold, points,
+                        x_offset, y_offset)
+    return points
+
+
+def diagonal_points(a, b, offset, window, threshold, points,
+                    x_offset=0, y_offset=0):
+    """Add the MATCH and GAP_MATCH points of the diagonal
+    x - y = offset to points; returns how many were found"""
+    x0, y0, counts = diagonal_window_counts(a, b, offset, window)
+    k = np.flatnonzero(counts >= threshold).astype(np.int32)
+    xs, ys = k + x0, k + y0
+    on_gap = b[ys] == GAP
+    xs += x_offset
+    ys += y_offset
+    points.extend(MATCH, xs[~on_gap], ys[~on_gap])
+    points.extend(GAP_MATCH, xs[on_gap], ys[on_gap])
+    return len(k)
+
+
+def indel_points(a, b, window, threshold, points):
+    """Add the INDEL points of the main diagonal of a and b to points"""
+    n = min(len(a), len(b))
+    gap_hits = (a[:n] == GAP) & (b[:n] != GAP)
+    diag = np.flatnonzero(window_sums(gap_hits, window) >= threshold)
+    points.extend(INDEL, diag, diag)
+    return points
+
+
+## k-mer seeding
+##
+## With a high threshold almost every cell of the dot matrix is a
+## non-hit. Instead of visiting them all, seq1 is indexed by k-mer and
+## seq2 is streamed against the index; only windows that contain an
+## exact k-mer match (a seed) are counted. A window with at least t
+## matches out of w has at most w - t mismatches, which split it into
+## at most w - t + 1 runs of matches, so one of them is at least
+## ceil(t / (w - t + 1)) long: with that seed length no hit is missed.
+##
+## Seeding only pays when the seeds are few. At the README's w=11/t=7
+## the seed length is 2, and nearly every window holds a seed. The
+## seeds are therefore counted before any window is verified. If
+## verifying them (window comparisons per candidate window) would cost
+## more than counting every cell, seeded_points hands the work to
+## window_points. It does the same when a k-mer over kmer_cap would
+## drop seeds, since the result would no longer be exact, and when
+## the threshold is outside 1..window, where seeds mean nothing.
+
+KMER_BASE = np.uint64(1099511628211)
+
+
+def seed_length(window, threshold):
+    """Return the longest seed length that cannot miss a hit"""
+    if not 1 <= threshold <= window:
+        raise ValueError('seeding needs 1 <= threshold <= window')
+    return -(-threshold // (window - threshold + 1))
+
+
+def kmer_keys(a, k):
+    """Return a 64-bit hash of every k-mer of the encoded sequence a.
+    Different k-mers can collide; every seed is verified afterwards."""
+    n = len(a) - k + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    keys = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        keys *= KMER_BASE
+        keys += a[j:j+n]
+    return keys
+
+
+class KmerIndex:
+
+    """k-mer -> positions index of an encoded sequence.
+
+    The keys are sorted once, so each lookup is a binary search.
+    k-mers occurring more than max_occurrences times (low-complexity
+    and repeat sequence) are left out of the index so they cannot
+    swamp the output; max_occurrences=None keeps them all.
+"""
+
+    def __init__(self, a, k, max_occurrences=1000):
+        self.k = k
+        self.max_occurrences = max_occurrences
+        keys = kmer_keys(a, k)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        uniq, starts, counts = np.unique(keys, return_index=True,
+                                         return_counts=True)
+        if max_occurrences is not None:
+            keep = counts <= max_occurrences
+            self.masked = int(np.count_nonzero(~keep))
+            self.masked_keys = uniq[~keep]
+            uniq, starts, counts = uniq[keep], starts[keep], counts[keep]
+        else:
+            self.masked = 0
+            self.masked_keys = np.zeros(0, dtype=np.uint64)
+        self.keys = uniq
+        self.starts = starts
+        self.counts = counts
+        self.positions = order.astype(np.int64)
+
+    def seed_counts(self, keys):
+        """Return (seeds, dropped): the seeds the k-mer keys of the
+        other sequence make with the index, and how many of those keys
+        hit a masked k-mer"""
+        slot = np.searchsorted(self.keys, keys)
+        slot[slot == len(self.keys)] = 0
+        found = (self.keys[slot] == keys if len(self.keys)
+                 else np.zeros(len(keys), dtype=bool))
+        dropped = np.count_nonzero(np.isin(keys, self.masked_keys))
+        return int(self.counts[slot[found]].sum()), int(dropped)
+
+    def lookup(self, keys):
+        """Return (query, position) index arrays, one pair per seed:
+        keys[query] is the k-mer found at positions[position]"""
+        slot = np.searchsorted(self.keys, keys)
+        slot[slot == len(self.keys)] = 0
+        found = (np.flatnonzero(self.keys[slot] == keys)
+                 if len(self.keys) else np.zeros(0, dtype=np.int64))
+        counts = self.counts[slot[found]]
+        query = np.repeat(found, counts)
+        # position of each seed within its k-mer's run of positions
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        within = np.arange(len(query)) - first
+        pos = self.positions[np.repeat(self.starts[slot[found]], counts)
+                             + within]
+        return query, pos
+
+
+def window_counts_at(a, b, xs, ys, window):
+    """Return the number of matches in each window starting at (xs, ys)"""
+    counts = np.zeros(len(xs), dtype=np.int32)
+    for j in range(window):
+        counts += a[xs + j] == b[ys + j]
+    return counts
+
+
+def seeded_points(seq1, seq2, window, threshold, k=None,
+                  kmer_cap=1000, index=None, chunk=1 << 16,
+                  points=None, stats=None):
+    """Compute the same points as window_points by seeding.
+
+Work scales with the number of seeds rather than the area of the
+matrix. seq2 is streamed through the index of seq1 in chunks of
+window start positions, so memory is bounded by the seeds of one
+chunk. When seeding would be slower than window_points, or k-mers
+occurring more than kmer_cap times in seq1 (unless kmer_cap is None)
+would drop seeds, window_points computes the points instead (see
+above). A stats dict is filled with k, masked (the k-mers over
+kmer_cap), seeds and fallback (why seeding was not used, or None).
+"""
+    if points is None:
+        points = PointSet()
+    if stats is None:
+        stats = {}
+    stats.update(k=None, masked=0, seeds=0, fallback=None)
+    a = encode_sequence(seq1)
+    b = encode_sequence(seq2)
+    last_x = len(a) - window
+    last_y = len(b) - window
+    if not 1 <= threshold <= window:
+        stats['fallback'] = 'threshold outside 1..window'
+    elif last_x >= 0 and last_y >= 0:
+        if k is None:
+            k = seed_length(window, threshold)
+        if index is None:
+            index = KmerIndex(a, k, kmer_cap)
+        seeds, dropped = index.seed_counts(kmer_keys(b, k))
+        stats.update(k=k, masked=index.masked, seeds=seeds)
+        if dropped:
+            stats['fallback'] = ('{} k-mers of seq2 are over kmer_cap'
+                                 .format(dropped))
+        elif (seeds * (window - k + 1) * window >
+              (last_x + 1) * (last_y + 1)):
+            stats['fallback'] = 'seeds not selective (k={})'.format(k)
+    if stats['fallback']:
+        return window_points(a, b, window, threshold, points)
+    if k is None:                   # a sequence is shorter than window
+        return indel_points(a, b, window, threshold, points)
+    slack = window - k
+    for c0 in range(0, last_y + 1, chunk):
+        c1 = min(c0 + chunk, last_y + 1)
+        # seeds inside any window starting in [c0, c1)
+        keys = kmer_keys(b[c0:c1 + slack + k - 1], k)
+        query, pos = index.lookup(keys)
+        if not len(query):
+            continue
+        cx = (pos[:, None] - np.arange(slack + 1)).ravel()
+        cy = ((query + c0)[:, None] - np.arange(slack + 1)).ravel()
+        ok = (cx >= 0) & (cx <= last_x) & (cy >= c0) & (cy < c1)
+        cell = np.unique(cy[ok] * (last_x + 1) + cx[ok])
+        cy, cx = np.divmod(cell, last_x + 1)
+        hit = window_counts_at(a, b, cx, cy, window) >= threshold
+        xs, ys = cx[hit], cy[hit]
+        on_gap = b[ys] == GAP
+        points.extend(MATCH, xs[~on_gap], ys[~on_gap])
+        points.extend(GAP_MATCH, xs[on_gap], ys[on_gap])
+    indel_points(a, b, window, threshold, points)
+    return points
+
+
+## Tiling
+##
+## window_points works a whole diagonal at a time, so its temporaries
+## grow with the sequences and all its points are held at once. The
+## tiled engine walks the dot matrix in tile x tile blocks of window
+## start positions instead. Each block is computed from slices of the
+## sequences that run window - 1 characters past the block, so that
+## windows crossing a tile edge are counted whole, and its points go
+## straight into the PointSet, typically a MappedPointSet on disk.
+
+TILE = 4096
+
+
+def tiles(last_x, last_y, tile=TILE):
+    """Yield (x0, x1, y0, y1) for the tiles covering the window start
+    positions 0..last_x by 0..last_y, row of tiles by row of tiles"""
+    for y0 in range(0, last_y + 1, tile):
+        for x0 in range(0, last_x + 1, tile):
+            yield (x0, min(x0 + tile, last_x + 1),
+                   y0, min(y0 + tile, last_y + 1))
+
+
+def tiled_points(seq1, seq2, window, threshold, tile=TILE, points=None):
+    """Compute the same points as window_points one tile at a time.
+
+Memory used by the computation is bounded by the tile size; pass a
+MappedPointSet as points to keep the results out of memory as well.
+"""
+    if points is None:
+        points = PointSet()
+    a = encode_sequence(seq1)
+    b = encode_sequence(seq2)
+    for x0, x1, y0, y1 in tiles(len(a) - window, len(b) - window, tile):
+        match_points(a[x0:x1 + window - 1], b[y0:y1 + window - 1],
+                     window, threshold, points, x0, y0)
+    indel_points(a, b, window, threshold, points)
+    return points
+
+
+## Banding
+##
+## DotPlot is normally given two aligned sequences, whose related
+## windows lie close to the main diagonal. The banded engine only
+## visits the diagonals within band of it. The default band is the
+## longest gap run of either sequence plus the window, since an indel
+## shifts a repeat off the diagonal by its length. Unrelated sequences
+## also give hits, at a rate that follows from their composition
+## (background_rate), so hits near the edge alone say nothing. Only
+## where the window diagonals at the edge of the band hold clearly
+## more hits than that background is the band widened on that side.
+## The cost is then L x band rather than L x L unless the plot really
+## has related windows further out.
+
+def longest_gap_run(a):
+    """Return the length of the longest run of gaps in encoded a"""
+    is_gap = np.zeros(len(a) + 2, dtype=np.int8)
+    is_gap[1:-1] = a == GAP
+    edges = np.diff(is_gap)
+    runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    return int(runs.max()) if len(runs) else 0
+
+
+def auto_band(a, b, window):
+    """Return the default band half-width for encoded a and b"""
+    return window + max(longest_gap_run(a), longest_gap_run(b))
+
+
+def background_rate(a, b, window, threshold):
+    """Return the chance that a window of unrelated sequences with the
+    composition of encoded a and b has at least threshold matches"""
+    if not len(a) or not len(b):
+        return 0.0
+    p = float(np.bincount(a, minlength=256) @
+              np.bincount(b, minlength=256)) / (len(a) * len(b))
+    return sum(math.comb(window, j) * p ** j * (1 - p) ** (window - j)
+               for j in range(max(threshold, 0), window + 1))
+
+
+def above_background(hits, windows, rate):
+    """Whether hits out of windows are well above rate (by about four
+    standard deviations, and a few hits more)"""
+    expected = windows * rate
+    return hits > expected + 4 * math.sqrt(expected) + 4
+
+
+def banded_points(seq1, seq2, window, threshold, band=None, points=None,
+                  stats=None):
+    """Compute the points of window_points that lie within band
+    diagonals of the main diagonal, widening the band where more hits
+    than background are found near its edge (band=None chooses it with
+    auto_band). A stats dict is given the diagonals evaluated, as lo
+    and hi offsets."""
+    if points is None:
+        points = PointSet()
+    a = encode_sequence(seq1)
+    b = encode_sequence(seq2)
+    if band is None:
+        band = auto_band(a, b, window)
+    first, last = -(len(b) - window), len(a) - window
+    lo, hi = max(-band, first), min(band, last)
+    if min(len(a), len(b)) < window:
+        lo, hi = 0, -1                  # no windows at all
+    rate = background_rate(a, b, window, threshold)
+    hits, windows = {}, {}
+
+    def evaluate(start, stop):
+        for offset in range(start, stop):
+            x0, y0 = diagonal_start(offset)
+            windows[offset] = (min(len(a) - x0, len(b) - y0) -
+                               window + 1)
+            hits[offset] = diagonal_points(a, b, offset, window,
+                                           threshold, points)
+
+    def edge_is_hit(edge):
+        return above_background(sum(hits.get(d, 0) for d in edge),
+                                sum(windows.get(d, 0) for d in edge),
+                                rate)
+
+    evaluate(lo, hi + 1)
+    step = max(band, window, 1)
+    while lo <= hi < last and edge_is_hit(range(hi - window + 1, hi + 1)):
+        evaluate(hi + 1, min(hi + step, last) + 1)
+        hi = min(hi + step, last)
+    while hi >= lo > first and edge_is_hit(range(lo, lo + window)):
+        evaluate(max(lo - step, first), lo)
+        lo = max(lo - step, first)
+    if stats is not None:
+        stats.update(lo=lo, hi=hi)
+    indel_points(a, b, window, threshold, points)
+    return points
+
+
+## Window sweeps
+##
+## Every window count is a difference of two prefix sums of the
+## matches along a diagonal, and the prefix sums do not depend on the
+## window. DiagonalIndex keeps them for every diagonal, concatenated
+## into one flat array, so any (window, threshold) pair is answered by
+## subtractions over the index, without recomparing the sequences. The
+## index holds a counter per cell of the matrix: uint16 when the
+## shorter sequence is under 65536 characters (differences are taken
+## modulo the type's range, which is exact since no count can exceed
+## it), uint32 otherwise. A query still visits every cell, so it is
+## taken a block of whole diagonals at a time, QUERY_CELLS cells per
+## block, to keep its temporaries small. Matrices of more than
+## INDEX_CELLS cells are not indexed (DiagonalIndex.fits): callers
+## compute their points with window_points instead.
+
+INDEX_CELLS = 1 << 26
+QUERY_CELLS = 1 << 22
+
+
+class DiagonalIndex:
+
+    """Per-diagonal prefix sums of the matches of two sequences.
+
+    points(window, threshold) returns the same PointSet as
+    window_points for any window and threshold. Building an index of
+    more than max_cells cells raises ValueError.
+"""
+
+    def __init__(self, seq1, seq2, max_cells=INDEX_CELLS):
+        if not self.fits(len(seq1), len(seq2), max_cells):
+            raise ValueError('{} x {} is too large to index (over {} '
+                             'cells)'.format(len(seq1), len(seq2),
+                                             max_cells))
+        self.a = a = encode_sequence(seq1)
+        self.b = b = encode_sequence(seq2)
+        offsets = np.arange(-(len(b) - 1), len(a), dtype=np.int64)
+        self.x0 = np.maximum(offsets, 0)
+        self.y0 = np.maximum(-offsets, 0)
+        self.lengths = np.minimum(len(a) - self.x0, len(b) - self.y0)
+        # diagonal d's sums are sums[starts[d]:starts[d] + lengths[d] + 1]
+        self.starts = np.zeros(len(offsets) + 1, dtype=np.int64)
+        np.cumsum(self.lengths + 1, out=self.starts[1:])
+        dtype = np.uint16 if min(len(a), len(b)) < 1 << 16 else np.uint32
+        self.sums = np.zeros(int(self.starts[-1]), dtype=dtype)
+        for d, (x0, y0, n, s) in enumerate(zip(
+                self.x0.tolist(), self.y0.tolist(),
+                self.lengths.tolist(), self.starts.tolist())):
+            np.cumsum(a[x0:x0+n] == b[y0:y0+n], out=self.sums[s+1:s+n+1])
+        n = min(len(a), len(b))
+        self.gap_sums = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum((a[:n] == GAP) & (b[:n] != GAP), out=self.gap_sums[1:])
+        # the first diagonal of each block of about QUERY_CELLS cells
+        self.blocks = np.unique(np.searchsorted(
+            self.starts, np.arange(0, self.starts[-1], QUERY_CELLS),
+            side='right') - 1).tolist() + [len(offsets)]
+
+    @staticmethod
+    def fits(len1, len2, max_cells=INDEX_CELLS):
+        """Whether a len1 x len2 matrix is small enough to index"""
+        return len1 * len2 <= max_cells
+
+    def nbytes(self):
+        return self.sums.nbytes + self.gap_sums.nbytes
+
+    def points(self, window, threshold, points=None):
+        """Return the points of the sequences for window and threshold"""
+        if points is None:
+            points = PointSet()
+        if window < 1:
+            raise ValueError('window must be at least 1')
+        for first, last in zip(self.blocks, self.blocks[1:]):
+            self.block_points(first, last, window, threshold, points)
+        gap_counts = self.gap_sums[window:] - self.gap_sums[:-window]
+        diag = np.flatnonzero(gap_counts >= threshold)
+        points.extend(INDEL, diag, diag)
+        return points
+
+    def block_points(self, first, last, window, threshold, points):
+        """Add the MATCH and GAP_MATCH points of diagonals first to
+        last - 1"""
+        start = self.starts[first]
+        sums = self.sums[start:self.starts[last]]
+        counts = sums[window:] - sums[:-window]
+        cell = np.flatnonzero(counts >= threshold) + start
+        # drop the windows that run past the end of their diagonal
+        d = np.searchsorted(self.starts[first:last + 1], cell,
+                            side='right') - 1 + first
+        k = cell - self.starts[d]
+        ok = k + window <= self.lengths[d]
+        d, k = d[ok], k[ok]
+        xs, ys = self.x0[d] + k, self.y0[d] + k
+        on_gap = self.b[ys] == GAP
+        points.extend(MATCH, xs[~on_gap], ys[~on_gap])
+        points.extend(GAP_MATCH, xs[on_gap], ys[on_gap])
+
+
+## Parallel diagonals
+##
+## Every diagonal is computed independently of the others, so the
+## diagonal range is split into chunks of roughly equal work (the work
+## of a diagonal is its number of windows, which falls off towards the
+## corners of the matrix) and the chunks run on a process pool. The
+## encoded sequences are placed in shared memory once rather than sent
+## with every chunk, and each chunk comes back as int32 arrays.
+
+# chunks per worker, so that uneven chunks still balance out
+CHUNKS_PER_JOB = 4
+
+# the shared sequences, attached in each worker by attach_shared
+_shared = {}
+
+
+def diagonal_chunks(len_a, len_b, window, chunks):
+    """Split the diagonals of a len_a x len_b matrix into at most
+    chunks (first, last) offset ranges with similar numbers of
+    windows"""
+    first, last = -(len_b - window), len_a - window
+    if last < first:
+        return []
+    offsets = np.arange(first, last + 1)
+    work = np.minimum(len_a - np.maximum(offsets, 0),
+                      len_b - np.maximum(-offsets, 0)) - window + 1
+    cumulative = np.cumsum(work)
+    targets = cumulative[-1] * np.arange(1, chunks) / chunks
+    cuts = np.unique(np.searchsorted(cumulative, targets, side='right'))
+    bounds = [0] + [int(c) for c in cuts if 0 < c < len(offsets)] + \
+        [len(offsets)]
+    return [(first + lo, first + hi - 1)
+            for lo, hi in zip(bounds, bounds[1:])]
+
+
+def attach_shared(name_a, len_a, name_b, len_b):
+    """Process pool initializer: map the shared sequences"""
+    from multiprocessing import shared_memory
+    for key, name, n in (('a', name_a, len_a), ('b', name_b, len_b)):
+        block = shared_memory.SharedMemory(name=name)
+        _shared[key + '_block'] = block
+        _shared[key] = np.ndarray(n, dtype=np.uint8, buffer=block.buf)
+
+
+def chunk_points(first, last, window, threshold):
+    """Process pool task: return the MATCH and GAP_MATCH columns of the
+    diagonals first..last of the shared sequences"""
+    points = PointSet((MATCH, GAP_MATCH))
+    for offset in range(first, last + 1):
+        diagonal_points(_shared['a'], _shared['b'], offset, window,
+                        threshold, points)
+    return [(points.xs(cat).copy(), points.ys(cat).copy())
+            for cat in points.categories]
+
+
+def share(a):
+    """Return a SharedMemory block holding a copy of encoded a"""
+    # imported here: multiprocessing and concurrent.futures take longer
+    # to import than most small plots take to compute
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(create=True, size=max(len(a), 1))
+    np.ndarray(len(a), dtype=np.uint8, buffer=block.buf)[:] = a
+    return block
+
+
+def parallel_points(seq1, seq2, window, threshold, jobs=None,
+                    points=None):
+    """Compute the same points as window_points on jobs processes
+    (default: one per core)"""
+    if points is None:
+        points = PointSet()
+    a = encode_sequence(seq1)
+    b = encode_sequence(seq2)
+    jobs = jobs or os.cpu_count() or 1
+    chunks = diagonal_chunks(len(a), len(b), window,
+                             jobs * CHUNKS_PER_JOB)
+    if jobs == 1 or len(chunks) <= 1:
+        match_points(a, b, window, threshold, points)
+        return indel_points(a, b, window, threshold, points)
+    from concurrent.futures import ProcessPoolExecutor
+    block_a, block_b = share(a), share(b)
+    try:
+        with ProcessPoolExecutor(
+                max_workers=jobs, initializer=attach_shared,
+                initargs=(block_a.name, len(a),
+                          block_b.name, len(b))) as pool:
+            results = pool.map(chunk_points,
+                               *zip(*chunks),
+                               [window] * len(chunks),
+                               [threshold] * len(chunks))
+            for columns in results:
+                for cat, (xs, ys) in zip((MATCH, GAP_MATCH), columns):
+                    points.extend(cat, xs, ys)
+    finally:
+        for block in (block_a, block_b):
+            block.close()
+            block.unlink()
+    return indel_points(a, b, window, threshold, points)
+
+
+## Progressive batches
+##
+## A window that shows the plot as it is computed wants the points a
+## piece at a time, starting with the pieces most likely to matter.
+## point_batches cuts the diagonals into the same work-balanced chunks
+## as the parallel engine and yields each chunk's points in turn,
+## nearest the main diagonal (where aligned sequences match) first.
+
+# windows per batch: a few tens of milliseconds of work
+BATCH_WINDOWS = 1 << 22
+
+
+def point_batches(seq1, seq2, window, threshold, both_strands=False,
+                  batch_windows=BATCH_WINDOWS, stop=None):
+    """Yield (fraction done, PointSet) for successive batches of
+    diagonals; together they hold the points of window_points. The
+    INDEL points come with the last batch. Stops early once stop (a
+    threading.Event) is set."""
+    a = encode_sequence(seq1)
+    b = encode_sequence(seq2)
+    rc = reverse_complement(b) if both_strands else None
+    categories = BOTH_STRANDS if both_strands else CATEGORIES
+    chunks = diagonal_chunks(len(a), len(b), window,
+                             max(1, -(-len(a) * len(b) // batch_windows)))
+    chunks.sort(key=lambda chunk: abs(chunk[0] + chunk[1]))
+    for n, (first, last) in enumerate(chunks):
+        if stop is not None and stop.is_set():
+            return
+        points = PointSet(categories)
+        for offset in range(first, last + 1):
+            diagonal_points(a, b, offset, window, threshold, points)
+            if both_strands:
+                reverse_points(a, rc, offset, window, threshold, points)
+        if n == len(chunks) - 1:
+            indel_points(a, b, window, threshold, points)
+        yield (n + 1) / len(chunks), points
+    if not chunks:
+        yield 1.0, indel_points(a, b, window, threshold,
+                                PointSet(categories))
+
+
+## Packed DNA
+##
+## A DNA sequence is stored as three bit planes, one bit per position
+## in little-endian uint64 words: the two bits of the base's code
+## (A=00, C=01, G=10, T=11) and a mask bit set for '-' and 'N', which
+## take the codes 00 and 01 under the mask. That is 3 bits a position
+## instead of 8. Two positions are identical exactly when all three
+## planes agree, so the matches along a diagonal come 64 positions per
+## word from three XORs.
+##
+## The diagonals are taken a block at a time, as a (diagonals x words)
+## array of match words, and never unpacked. The window counts are
+## bit-sliced: count bit i of every position sits in its own array of
+## words, and counts over 2, 4, 8, ... positions are built by adding
+## the counts to themselves shifted along the diagonal, so a window of
+## w positions costs about log2(w) word additions for 64 positions at
+## once. The comparison with the threshold is bit-sliced too, and only
+## the words holding a hit are unpacked into points.
+
+PACKED_CODES = {ord('A'): (0, 0, 0), ord('C'): (0, 1, 0),
+                ord('G'): (1, 0, 0), ord('T'): (1, 1, 0),
+                ord('-'): (0, 0, 1), ord('N'): (0, 1, 1)}
+
+# words in each (diagonals x words) array of a block
+PACKED_BLOCK_WORDS = 1 << 15
+
+ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def pack_bits(bits):
+    """Return a bool array as little-endian uint64 words, followed by
+    a zero word so that shifted reads never run off the end"""
+    n = -(-len(bits) // 64) + 1
+    packed = np.zeros(n * 8, dtype=np.uint8)
+    raw = np.packbits(bits, bitorder='little')
+    packed[:len(raw)] = raw
+    return packed.view('<u8')
+
+
+def read_words(plane, starts, nwords):
+    """Return the (len(starts), nwords) words of plane whose row i
+    begins at bit starts[i]; equal starts are read once"""
+    if len(starts) > 1 and starts.min() == starts.max():
+        return np.broadcast_to(read_words(plane, starts[:1], nwords),
+                               (len(starts), nwords))
+    index = (starts >> 6)[:, None] + np.arange(nwords)
+    # words past the end only feed bits that are masked off later
+    np.minimum(index, len(plane) - 2, out=index)
+    shift = (starts & 63).astype(np.uint64)[:, None]
+    # numpy shifts by 64 give 0, so shift 0 takes nothing from the next
+    return (plane[index] >> shift) | (plane[index + 1] <<
+                                     (np.uint64(64) - shift))
+
+
+def shift_bits(words, count):
+    """Return rows of words moved count bits towards bit 0, so that
+    bit k of a row becomes what was bit k + count"""
+    if not count:
+        return words
+    whole, count = divmod(count, 64)
+    shifted = np.zeros_like(words)
+    kept = words.shape[1] - whole
+    if kept <= 0:
+        return shifted
+    if not count:
+        shifted[:, :kept] = words[:, whole:]
+        return shifted
+    np.right_shift(words[:, whole:], np.uint64(count), out=shifted[:, :kept])
+    following = words[:, whole + 1:] << np.uint64(64 - count)
+    shifted[:, :kept - 1] |= following
+    return shifted
+
+
+def add_sliced(a, b, nbits):
+    """Return the sum of two bit-sliced counts (lists of word arrays,
+    least significant bit first), keeping at most nbits bits"""
+    total, carry = [], None
+    for i in range(nbits):
+        terms = [term for term in (a[i] if i < len(a) else None,
+                                   b[i] if i < len(b) else None, carry)
+                 if term is not None]
+        if not terms:
+            break
+        if len(terms) == 1:
+            total.append(terms[0])
+            carry = None
+        elif len(terms) == 2:
+            total.append(terms[0] ^ terms[1])
+            carry = terms[0] & terms[1]
+        else:
+            either = terms[0] ^ terms[1]
+            total.append(either ^ terms[2])
+            carry = terms[0] & terms[1]
+            either &= terms[2]
+            carry |= either
+    return total
+
+
+def sliced_window_counts(words, window):
+    """Return the bit-sliced count of set bits in each window of
+    window bits along the rows of words"""
+    nbits = window.bit_length()
+    counts, done = None, 0
+    span, span_counts = 1, [words]          # counts over span bits
+    while True:
+        if window & span:
+            part = [shift_bits(plane, done) for plane in span_counts]
+            counts = part if counts is None else add_sliced(counts, part,
+                                                            nbits)
+            done += span
+        if span * 2 > window:
+            return counts
+        span_counts = add_sliced(
+            span_counts, [shift_bits(plane, span) for plane in span_counts],
+            nbits)
+        span *= 2
+
+
+def sliced_at_least(counts, threshold):
+    """Return words with the bits set where a bit-sliced count is at
+    least threshold"""
+    if threshold <= 0:
+        return np.full_like(counts[0], ONES)
+    if threshold >> len(counts):
+        return np.zeros_like(counts[0])
+    above = np.zeros_like(counts[0])
+    equal = np.full_like(counts[0], ONES)
+    for i in reversed(range(len(counts))):
+        if threshold >> i & 1:
+            equal &= counts[i]
+        else:
+            above |= equal & counts[i]
+            equal &= ~counts[i]
+    return above | equal
+
+
+def first_bits(lengths, nwords):
+    """Return (len(lengths), nwords) words with the first lengths[i]
+    bits of row i set"""
+    bits = np.clip(lengths[:, None] - 64 * np.arange(nwords), 0, 64)
+    # 1 << 64 is 0 in numpy, and 0 - 1 wraps to all ones
+    return (np.uint64(1) << bits.astype(np.uint64)) - np.uint64(1)
+
+
+def set_bits(words):
+    """Return (row, bit) of every set bit of a (rows x words) array, in
+    row and then bit order"""
+    rows, cols = np.nonzero(words)
+    values = words[rows, cols]
+    if not hasattr(np, 'bitwise_count'):          # NumPy < 2.0
+        bits = np.unpackbits(values.astype('<u8').view(np.uint8)
+                             .reshape(-1, 8), axis=1, bitorder='little')
+        hit, bit = np.nonzero(bits)
+        return rows[hit], cols[hit] * 64 + bit
+    # peel off the lowest set bit of every word still holding one, so
+    # the work follows the number of points rather than of words
+    counts = np.bitwise_count(values).astype(np.int64)
+    starts = np.cumsum(counts) - counts
+    bits = np.empty(int(counts.sum()), dtype=np.int64)
+    index = np.arange(len(values))
+    one = np.uint64(1)
+    for i in range(int(counts.max(initial=0))):
+        if i:
+            more = counts[index] > i
+            index, values = index[more], values[more]
+        # the popcount of the bits up to the lowest set one is its place
+        bits[starts[index] + i] = np.bitwise_count(values ^ (values - one))
+        values = values & (values - one)
+    bits -= 1
+    owner = np.repeat(np.arange(len(rows)), counts)
+    return rows[owner], cols[owner] * 64 + bits
+
+
+class PackedDNA:
+
+    """A DNA sequence in three bit planes (see above).
+
+    Only A, C, G, T, N and '-' can be packed; anything else (including
+    lower case) raises ValueError.
+"""
+
+    def __init__(self, seq):
+        a = encode_sequence(seq)
+        table = np.full((256, 3), 255, dtype=np.uint8)
+        for ch, code in PACKED_CODES.items():
+            table[ch] = code
+        codes = table[a]
+        if np.any(codes[:, 0] == 255):
+            bad = sorted(set(a[codes[:, 0] == 255].tobytes().decode(
+                'latin-1')))
+            raise ValueError('cannot pack characters ' + ''.join(bad) +
+                             '; use another engine')
+        self.length = len(a)
+        self.planes = [pack_bits(codes[:, plane].astype(bool))
+                       for plane in range(3)]
+
+    def __len__(self):
+        return self.length
+
+    def nbytes(self):
+        return sum(plane.nbytes for plane in self.planes)
+
+    def words(self, start, count):
+        """Return the planes of positions start..start + count - 1,
+        shifted to begin at bit 0 of their first word"""
+        first, shift = divmod(start, 64)
+        nwords = -(-count // 64)
+        if not shift:
+            return [plane[first:first+nwords] for plane in self.planes]
+        shift = np.uint64(shift)
+        back = np.uint64(64) - shift
+        return [(plane[first:first+nwords] >> shift) |
+                (plane[first+1:first+nwords+1] << back)
+                for plane in self.planes]
+
+    def gaps(self, start, count):
+        """Return the words of the '-' positions start..start + count - 1"""
+        high, low, mask = self.words(start, count)
+        return mask & ~high & ~low
+
+
+def packed_points(seq1, seq2, window, threshold, points=None):
+    """Compute the same points as window_points from PackedDNA
+    encodings of seq1 and seq2 (or PackedDNA objects themselves)"""
+    if points is None:
+        points = PointSet()
+    a = seq1 if isinstance(seq1, PackedDNA) else PackedDNA(seq1)
+    b = seq2 if isinstance(seq2, PackedDNA) else PackedDNA(seq2)
+    b_gaps = b.gaps(0, len(b))
+    offsets = np.arange(-(len(b) - window), len(a) - window + 1)
+    x0 = np.maximum(offsets, 0)
+    y0 = np.maximum(-offsets, 0)
+    lengths = np.minimum(len(a) - x0, len(b) - y0)
+    rows = max(1, PACKED_BLOCK_WORDS // (-(-int(lengths.max(initial=0))
+                                           // 64) or 1))
+    # blocks stay on one side of the main diagonal, where x0 or y0 is 0
+    middle = int(np.searchsorted(offsets, 0))
+    for first in itertools.chain(range(0, middle, rows),
+                                 range(middle, len(offsets), rows)):
+        block = slice(first, min(first + rows,
+                                 middle if first < middle else len(offsets)))
+        nwords = -(-int(lengths[block].max()) // 64)
+        differ = 0
+        for plane_a, plane_b in zip(a.planes, b.planes):
+            differ = differ | (read_words(plane_a, x0[block], nwords) ^
+                               read_words(plane_b, y0[block], nwords))
+        hits = sliced_at_least(sliced_window_counts(~differ, window),
+                               threshold)
+        hits &= first_bits(lengths[block] - window + 1, nwords)
+        d, k = set_bits(hits)
+        xs = (x0[block][d] + k).astype(np.int32)
+        ys = (y0[block][d] + k).astype(np.int32)
+        on_gap = ((b_gaps[ys >> 6] >> (ys & 63).astype(np.uint64)) &
+                  np.uint64(1)).astype(bool)
+        points.extend(MATCH, xs[~on_gap], ys[~on_gap])
+        points.extend(GAP_MATCH, xs[on_gap], ys[on_gap])
+    n = min(len(a), len(b))
+    if n >= window:
+        indels = (a.gaps(0, n) & ~b.gaps(0, n))[None, :]
+        hits = sliced_at_least(sliced_window_counts(indels, window),
+                               threshold)
+        hits &= first_bits(np.array([n - window + 1]), hits.shape[1])
+        _, diag = set_bits(hits)
+        points.extend(INDEL, diag, diag)
+    return points
+
+
+## Substitution scores
+##
+## Identity is a weak signal between protein sequences, where
+## different residues can be near-equivalent. The scored engine sums
+## substitution matrix scores (BLOSUM62 by default) over each window
+## instead of counting identical characters, and keeps the windows
+## scoring at least threshold. The matrix becomes a 256 x 256 table
+## indexed by character code, so the scores of a whole diagonal are
+## one NumPy gather, followed by the same cumulative sum as the
+## identity counts.
+
+MATRIX = 'BLOSUM62'
+
+_score_tables = {}
+
+
+def score_table(matrix=MATRIX):
+    """Return the 256 x 256 score table of a Biopython substitution
+    matrix name (int16, or float64 for non-integer matrices).
+
+Lower case letters score as upper case. Characters outside the
+matrix's alphabet, gaps included, score the matrix's lowest score
+against everything.
+"""
+    if matrix not in _score_tables:
+        from Bio.Align import substitution_matrices
+        try:
+            scores = substitution_matrices.load(matrix)
+        except FileNotFoundError:
+            raise ValueError('unknown substitution matrix: ' +
+                             repr(matrix))
+        values = np.asarray(scores)
+        dtype = (np.int16 if np.array_equal(values, np.round(values))
+                 else np.float64)
+        table = np.full((256, 256), values.min(), dtype=dtype)
+        codes = [[ord(ch)] + ([ord(ch.lower())] if ch.isalpha() else [])
+                 for ch in scores.alphabet]
+        for i, rows in enumerate(codes):
+            for j, cols in enumerate(codes):
+                table[np.ix_(rows, cols)] = values[i, j]
+        _score_tables[matrix] = table
+    return _score_tables[matrix]
+
+
+def scored_points(seq1, seq2, window, threshold, matrix=MATRIX,
+                  points=None):
+    """Add the MATCH and GAP_MATCH points of the windows of seq1
+    against seq2 whose summed substitution scores reach threshold.
+    There are no INDEL points, since a gap run has no score to
+    compare with threshold."""
+    if points is None:
+        points = PointSet()
+    a = encode_sequence(seq1)
+    b = encode_sequence(seq2)
+    table = score_table(matrix)
+    dtype = np.int32 if table.dtype == np.int16 else np.float64
+    for offset in range(-(len(b) - window), len(a) - window + 1):
+        x0, y0 = diagonal_start(offset)
+        n = min(len(a) - x0, len(b) - y0)
+        sums = window_sums(table[a[x0:x0+n], b[y0:y0+n]], window, dtype)
+        k = np.flatnonzero(sums >= threshold).astype(np.int32)
+        xs, ys = k + x0, k + y0
+        on_gap = b[ys] == GAP
+        points.extend(MATCH, xs[~on_gap], ys[~on_gap])
+        points.extend(GAP_MATCH, xs[on_gap], ys[on_gap])
+    return points
+
+
+ENGINES = ('numpy', 'seeded', 'tiled', 'banded', 'indexed', 'parallel',
+           'packed', 'scored')
+
+
+def compute_points(seq1, seq2, window, threshold, engine='numpy',
+                   kmer_cap=1000, tile=TILE, points_file=None,
+                   band=None, jobs=None, both_strands=False, matrix=MATRIX,
+                   stats=None):
+    """Return the PointSet of seq1 against seq2 computed by engine,
+    taking the same options as DotPlot. With points_file the points
+    are written to a MappedPointSet there, which is returned open for
+    reading. both_strands (REVERSE points) needs the numpy engine. The
+    scored engine's threshold is a window score under matrix. The
+    seeded engine fills the stats dict (see seeded_points)."""
+    if engine not in ENGINES:
+        raise ValueError('unknown engine: ' + repr(engine))
+    if both_strands and engine != 'numpy':
+        raise ValueError('both strands need the numpy engine')
+    categories = BOTH_STRANDS if both_strands else CATEGORIES
+    points = (MappedPointSet(points_file, 'w', categories) if points_file
+              else PointSet(categories))
+    if engine == 'numpy':
+        window_points(seq1, seq2, window, threshold, points, both_strands)
+    elif engine == 'seeded':
+        seeded_points(seq1, seq2, window, threshold,
+                      kmer_cap=kmer_cap, points=points, stats=stats)
+    elif engine == 'tiled':
+        tiled_points(seq1, seq2, window, threshold, tile, points)
+    elif engine == 'banded':
+        banded_points(seq1, seq2, window, threshold, band, points)
+    elif engine == 'indexed':
+        if DiagonalIndex.fits(len(seq1), len(seq2)):
+            DiagonalIndex(seq1, seq2).points(window, threshold, points)
+        else:
+            window_points(seq1, seq2, window, threshold, points)
+    elif engine == 'parallel':
+        parallel_points(seq1, seq2, window, threshold, jobs, points)
+    elif engine == 'packed':
+        packed_points(seq1, seq2, window, threshold, points)
+    else:
+        scored_points(seq1, seq2, window, threshold, matrix, points)
+    if points_file:
+        points.close()
+    return points
@@ -0,0 +1,323 @@
+"""Indexed FASTA input, plain or compressed, with region selection
+
+Reading a FASTA file with SeqIO parses and holds every record whole.
+IndexedFasta instead keeps a samtools-style .fai index of the file (the
+name, length, offset of the first base and line layout of each record)
+and reads only the bytes of the regions asked for:
+
+    with IndexedFasta('genome.fa.gz') as fasta:
+        name, start, seq = fasta.region('chr2:1000001-1050000')
+
+Regions are written like samtools faidx's: 'name' for a whole record,
+'name:start-end' with 1-based inclusive coordinates, or 'name:start'
+for the rest of the record. Sequences are returned as bytes, with the
+record's name and the 0-based offset of their first base in it (here
+'chr2' and 1000000). A region naming no record raises UnknownSequence
+and a malformed one BadRegion.
+
+Plain files are memory-mapped. BGZF files (as written by bgzip) are
+read a block at a time: a table of the blocks' compressed and
+uncompressed offsets is read from the .gzi file bgzip -i writes, or
+else built by skipping from block header to block header. Ordinary
+gzip files can't be read from the middle, so a region read decompresses
+everything before it; for repeated use, recompress them with bgzip.
+
+The index is read from <file>.fai when that is at least as new as the
+file, and otherwise built by one pass over the file and saved there if
+the directory is writable. For compressed files its offsets are
+offsets into the uncompressed data, as samtools' are.
+"""
+
+import bisect
+from collections import namedtuple, OrderedDict
+import gzip
+import mmap
+import os
+import re
+import struct
+import zlib
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+FaiRecord = namedtuple('FaiRecord',
+                       'name length offset linebases linewidth')
+
+
+class UnknownSequence(KeyError):
+    """A region names no record of the FASTA file"""
+
+    def __str__(self):
+        return self.args[0]
+
+
+class BadRegion(ValueError):
+    """A region string that can't be parsed"""
+
+
+REGION = re.compile(r'^(?P<name>.+?)(?::(?P<start>[\d,]+)'
+                    r'(?:-(?P<end>[\d,]+))?)?$')
+
+
+def compression(filename):
+    """Return 'plain', 'gzip' or 'bgzf'"""
+    with open(filename, 'rb') as fil:
+        header = fil.read(18)
+    if header[:2] != GZIP_MAGIC:
+        return 'plain'
+    # BGZF: FEXTRA set and a 'BC' subfield holding the block size
+    if len(header) == 18 and header[3] & 4 and header[12:14] == b'BC':
+        return 'bgzf'
+    return 'gzip'
+
+
+def open_text(filename):
+    """Open a plain or gzip-compressed (including BGZF) file as text"""
+    if compression(filename) == 'plain':
+        return open(filename)
+    return gzip.open(filename, 'rt')
+
+
+def parse_region(text):
+    """Return (name, start, end) of a region, 0-based and half-open;
+    start and end are None when not given"""
+    match = REGION.match(text)
+    if not match:
+        raise BadRegion('bad region: ' + repr(text))
+    start, end = match.group('start'), match.group('end')
+    start = int(start.replace(',', '')) - 1 if start else None
+    end = int(end.replace(',', '')) if end else None
+    if start is not None and start < 0:
+        raise BadRegion('region start must be at least 1: ' + repr(text))
+    return match.group('name'), start, end
+
+
+def build_index(fil):
+    """Return the FaiRecords of a binary FASTA stream, in file order"""
+    records = []
+    name = None
+    offset = length = linebases = linewidth = 0
+    short_line = False          # the record's last line has been seen
+
+    def finish():
+        if name is not None:
+            records.append(FaiRecord(name, length, offset,
+                                     linebases, linewidth))
+
+    position = 0
+    for line in fil:
+        width = len(line)
+        if line.startswith(b'>'):
+            finish()
+            name = line[1:].split(None, 1)[0].decode('latin-1') \
+                if line[1:].strip() else ''
+            offset = position + width
+            length = linebases = linewidth = 0
+            short_line = False
+        elif name is not None:
+            bases = len(line.rstrip(b'\r\n'))
+            if not linebases:
+                linebases, linewidth = bases, width
+            elif ((short_line and bases) or bases > linebases or
+                  (bases == linebases and width != linewidth)):
+                # only the last line of a record may differ
+                raise ValueError('different line length in sequence ' +
+                                 repr(name))
+            elif bases < linebases:
+                short_line = True
+            length += bases
+        position += width
+    finish()
+    return records
+
+
+def read_fai(filename):
+    records = []
+    with open(filename) as fil:
+        for line in fil:
+            name, length, offset, linebases, linewidth = \
+                line.rstrip('\n').split('\t')[:5]
+            records.append(FaiRecord(name, int(length), int(offset),
+                                     int(linebases), int(linewidth)))
+    return records
+
+
+def write_fai(filename, records):
+    with open(filename, 'w') as fil:
+        for record in records:
+            fil.write('\t'.join(map(str, record)) + '\n')
+
+
+class PlainReader:
+
+    def __init__(self, filename):
+        self.fil = open(filename, 'rb')
+        self.map = (mmap.mmap(self.fil.fileno(), 0, access=mmap.ACCESS_READ)
+                    if os.path.getsize(filename) else b'')
+
+    def read(self, offset, size):
+        return self.map[offset:offset+size]
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        self.fil.close()
+
+
+class GzipReader:
+
+    """Reads of an ordinary gzip file: seeking decompresses up to the
+    offset (backwards seeks start over from the beginning)"""
+
+    def __init__(self, filename):
+        self.fil = gzip.open(filename, 'rb')
+
+    def read(self, offset, size):
+        self.fil.seek(offset)
+        return self.fil.read(size)
+
+    def close(self):
+        self.fil.close()
+
+
+class BGZFReader:
+
+    """Reads of a BGZF file, decompressing only the blocks they touch.
+
+    blocks and starts list the compressed and uncompressed offsets of
+    the blocks.
+"""
+
+    def __init__(self, filename):
+        self.fil = open(filename, 'rb')
+        try:
+            self.blocks, self.starts = self.read_gzi(filename + '.gzi')
+        except (OSError, struct.error):
+            self.blocks, self.starts = self.scan_blocks()
+        self.cache = (None, b'')        # (block number, its data)
+
+    @staticmethod
+    def read_gzi(filename):
+        """Return the block offsets listed in a bgzip .gzi index"""
+        with open(filename, 'rb') as fil:
+            count, = struct.unpack('<Q', fil.read(8))
+            pairs = struct.unpack('<{}Q'.format(2 * count),
+                                  fil.read(16 * count))
+        return [0] + list(pairs[0::2]), [0] + list(pairs[1::2])
+
+    def scan_blocks(self):
+        """Return the block offsets, read from the block headers"""
+        blocks, starts = [], []
+        coffset = uoffset = 0
+        end = os.fstat(self.fil.fileno()).st_size
+        while coffset < end:
+            self.fil.seek(coffset)
+            header = self.fil.read(18)
+            bsize, = struct.unpack('<H', header[16:18])
+            self.fil.seek(coffset + bsize + 1 - 4)
+            isize, = struct.unpack('<I', self.fil.read(4))
+            blocks.append(coffset)
+            starts.append(uoffset)
+            coffset += bsize + 1
+            uoffset += isize
+        return blocks, starts
+
+    def block(self, number):
+        if self.cache[0] != number:
+            self.fil.seek(self.blocks[number])
+            header = self.fil.read(12)
+            xlen, = struct.unpack('<H', header[10:12])
+            self.fil.seek(self.blocks[number] + 12 + xlen)
+            end = (self.blocks[number + 1] if number + 1 < len(self.blocks)
+                   else os.fstat(self.fil.fileno()).st_size)
+            data = self.fil.read(end - self.blocks[number] - 12 - xlen - 8)
+            self.cache = (number, zlib.decompress(data, -15))
+        return self.cache[1]
+
+    def read(self, offset, size):
+        number = bisect.bisect_right(self.starts, offset) - 1
+        pieces = []
+        while size > 0 and number < len(self.blocks):
+            data = self.block(number)
+            skip = offset - self.starts[number]
+            piece = data[skip:skip+size]
+            pieces.append(piece)
+            offset += len(piece)
+            size -= len(piece)
+            number += 1
+        return b''.join(pieces)
+
+    def close(self):
+        self.fil.close()
+
+
+READERS = {'plain': PlainReader, 'gzip': GzipReader, 'bgzf': BGZFReader}
+
+
+class IndexedFasta:
+
+    """Random access to the records of a FASTA file.
+
+    index maps each record name to its FaiRecord, in file order.
+    fetch(name, start, end) returns bases start..end-1 (0-based) of a
+    record as bytes; region(text) returns (name, start, bases) of a
+    region string.
+"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.compression = compression(filename)
+        self.index = OrderedDict((record.name, record)
+                                 for record in self.load_index())
+        self.reader = READERS[self.compression](filename)
+
+    def load_index(self):
+        fai = self.filename + '.fai'
+        if (os.path.exists(fai) and
+                os.path.getmtime(fai) >= os.path.getmtime(self.filename)):
+            return read_fai(fai)
+        opener = open if self.compression == 'plain' else gzip.open
+        with opener(self.filename, 'rb') as fil:
+            records = build_index(fil)
+        try:
+            write_fai(fai, records)
+        except OSError:
+            pass
+        return records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.reader.close()
+
+    def names(self):
+        return list(self.index)
+
+    def fetch(self, name, start=None, end=None):
+        if name not in self.index:
+            raise UnknownSequence('no sequence named {!r} in {}'.format(
+                name, self.filename))
+        record = self.index[name]
+        start = 0 if start is None else min(start, record.length)
+        end = record.length if end is None else min(end, record.length)
+        if end <= start:
+            return b''
+
+        def file_offset(pos):
+            lines, column = divmod(pos, record.linebases)
+            return record.offset + lines * record.linewidth + column
+
+        first = file_offset(start)
+        data = self.reader.read(first, file_offset(end - 1) + 1 - first)
+        return data.translate(None, b'\r\n')
+
+    def region(self, text):
+        """Return (record name, 0-based start, bases) of a region string"""
+        name, start, end = parse_region(text)
+        if name not in self.index and text in self.index:
+            name, start, end = text, None, None     # a name with a colon
+        bases = self.fetch(name, start, end)
+        return name, min(start or 0, self.index[name].length), bases
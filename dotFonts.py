@@ -0,0 +1,84 @@
+"""On-disk cache of resolved Tk font families
+
+Plot.findfont tries the faces of a list one at a time, building a Tk
+Font for each, until Tk reports that it really has one of them. The
+answer only changes when fonts are installed or removed, so it is
+saved here, per windowing system and face list, and the next run
+builds a single Font for the cached family (and checks it) instead.
+
+The cache is a JSON file, by default dotPlotter/fonts.json under
+$XDG_CACHE_HOME (or ~/.cache); $DOTPLOTTER_FONT_CACHE names another
+file, and an empty $DOTPLOTTER_FONT_CACHE turns the cache off. Errors
+reading or writing it are ignored: the faces are then simply resolved
+again.
+"""
+
+import json
+import os
+
+MISSING = object()
+
+
+def default_path():
+    if 'DOTPLOTTER_FONT_CACHE' in os.environ:
+        return os.environ['DOTPLOTTER_FONT_CACHE'] or None
+    cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'dotPlotter', 'fonts.json')
+
+
+class FontCache:
+
+    """{key: family} read from, and written back to, a JSON file.
+
+    get() returns MISSING for an unknown key; a cached family of None
+    means none of the faces was available.
+"""
+
+    def __init__(self, path):
+        self.path = path
+        self.families = {}
+        if path:
+            try:
+                with open(path) as fil:
+                    self.families = json.load(fil)
+            except (OSError, ValueError):
+                pass
+
+    @staticmethod
+    def key(windowing_system, faces, bold=False, italic=False):
+        return '{}:{}{}{}'.format(windowing_system, ','.join(faces),
+                                  ':bold' if bold else '',
+                                  ':italic' if italic else '')
+
+    def get(self, key):
+        return self.families.get(key, MISSING)
+
+    def put(self, key, family):
+        if self.families.get(key, MISSING) == family:
+            return
+        self.families[key] = family
+        if not self.path:
+            return
+        temp = '{}.{}'.format(self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp, 'w') as fil:
+                json.dump(self.families, fil, indent=1)
+            os.replace(temp, self.path)
+        except OSError:
+            pass
+
+    def forget(self, key):
+        self.families.pop(key, None)
+
+
+_cache = None
+
+
+def cache():
+    """Return the process's FontCache, reading it on first use"""
+    global _cache
+    if _cache is None:
+        _cache = FontCache(default_path())
+    return _cache
@@ -0,0 +1,388 @@
+"""The dotPlotter pipeline as importable stages
+
+Reading the FASTA, aligning, building the BED file, computing the dot
+plot points and exporting them need no display: none of the stages
+here import tkinter. Only show() loads Tk, and only when an
+interactive window is actually wanted; Biopython is likewise only
+imported when a FASTA file is read.
+
+    from dotPipeline import run
+    result = run('test.fasta', 9, 11, 7, outdir='out')
+"""
+
+from collections import namedtuple
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+import dotAlign
+import dotEngine
+import dotFasta
+import dotProfile
+import dotRaster
+import dotVector
+from dotPoints import Segments, CATEGORY_NAMES
+
+OUTDIR = 'dotPlotterOut'
+GAP = ord('-')
+POINTS_FILE = 'dotPoints'     # prefix of the tiled engine's point files
+PNG_MAX_SIDE = 4096           # longest side of a headless PNG, in pixels
+
+
+def read_fasta(filename):
+    """Return a list of (id, seq) for every FASTA record; the file may
+    be gzip-compressed"""
+    from Bio import SeqIO
+    with dotFasta.open_text(filename) as fil:
+        return [(fasta.id, str(fasta.seq))
+                for fasta in SeqIO.parse(fil, 'fasta')]
+
+
+SequencePair = namedtuple('SequencePair',
+                          'idA seqA idB seqB startA startB')
+
+
+def read_fasta_pair(filename, regions=()):
+    """Return the SequencePair of the first two FASTA records, or of
+    the first two of regions ('name', 'name:start-end'); the file may be
+    gzip-compressed. Regions are read through the file's .fai index (see
+    dotFasta) and returned as bytes, named by their record, with startA
+    and startB the 0-based offsets of their first bases in it (0 for
+    whole records). An unknown record name raises
+    dotFasta.UnknownSequence, a malformed region dotFasta.BadRegion."""
+    if regions:
+        with dotProfile.stage('read_regions'), \
+                dotFasta.IndexedFasta(filename) as fasta:
+            selected = [fasta.region(region) for region in regions[:2]]
+        (seqAid, startA, seqA), (seqBid, startB, seqB) = \
+            selected[0], selected[-1]
+        return SequencePair(seqAid, seqA, seqBid, seqB, startA, startB)
+    from Bio import SeqIO
+    seqAid = seqA = seqBid = seqB = ""
+    with dotProfile.stage('read_fasta'), \
+            dotFasta.open_text(filename) as fil:
+        records = SeqIO.parse(fil, 'fasta')
+        for fasta in records:
+            if not seqAid:
+                seqAid, seqA = fasta.id, str(fasta.seq)
+            else:
+                seqBid, seqB = fasta.id, str(fasta.seq)
+                break
+    if not seqBid:
+        seqBid, seqB = seqAid, seqA
+    return SequencePair(seqAid, seqA, seqBid, seqB, 0, 0)
+
+
+def align(seqA, seqB, scoring=dotAlign.GLOBALXX, idA='seqA', idB='seqB',
+          startA=0, startB=0):
+    """Globally align seqA and seqB with (match, mismatch, gap) scoring;
+    returns a dotAlign.Alignment. startA and startB are the offsets of
+    the sequences in their records, for regions of them."""
+    with dotProfile.stage('align', lengthA=len(seqA), lengthB=len(seqB)):
+        return dotAlign.global_align(seqA, seqB, *scoring,
+                                     idA=idA, idB=idB,
+                                     startA=startA, startB=startB)
+
+
+def write_report(alignment, outdir=OUTDIR):
+    """Start writing alignmentInfo.txt in the background; returns the
+    thread, which must be joined before the file is used"""
+    filename = os.path.join(outdir, 'alignmentInfo.txt')
+    thread = alignment.write_report_async(filename)
+    thread.filename = filename
+    return thread
+
+
+def finish_report(thread):
+    if thread:
+        with dotProfile.stage('report'):
+            thread.join()
+        print("wrote", thread.filename)
+
+
+def gap_runs(aligned, size=1):
+    """Return (starts, stops), the alignment columns of every run of
+    gaps in the encoded aligned sequence at least size long, including
+    runs at either end of the alignment"""
+    is_gap = np.zeros(len(aligned) + 2, dtype=np.int8)
+    is_gap[1:-1] = aligned == GAP
+    edges = np.diff(is_gap)
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    keep = stops - starts >= max(size, 1)
+    return starts[keep], stops[keep]
+
+
+def residues_before(aligned):
+    """Return r where r[i] is the number of non-gap characters of the
+    encoded aligned sequence before column i, for i up to its length"""
+    r = np.zeros(len(aligned) + 1, dtype=np.int64)
+    np.cumsum(aligned != GAP, out=r[1:])
+    return r
+
+
+BED_HEADER = '#chrom\tchromStart\tchromEnd\tname\tscore\tstrand\n'
+TABLE_HEADER = '#seqid\talnStart\talnEnd\tseqPos\totherStart\totherEnd\n'
+
+
+def indel_rows(aligned, other, size, start=0, other_start=0):
+    """Return (alnStart, alnEnd, seqPos, otherStart, otherEnd) lists for
+    the gap runs of aligned at least size long: the run's alignment
+    columns, the position in the ungapped sequence where the gap falls,
+    and the residues of the other ungapped sequence aligned against it.
+    start and other_start, the sequences' offsets in their records, are
+    added to the positions in them."""
+    starts, stops = gap_runs(aligned, size)
+    own, theirs = residues_before(aligned), residues_before(other)
+    return (starts.tolist(), stops.tolist(), (own[starts] + start).tolist(),
+            (theirs[starts] + other_start).tolist(),
+            (theirs[stops] + other_start).tolist())
+
+
+def bed_lines(seqid, otherid, aligned, other, size, start=0, other_start=0):
+    """Return the BED6 lines for the gap runs of aligned at least size
+    long.
+
+Each line is an interval of the other, ungapped sequence (otherid): the
+residues aligned against the gap, that is the ones missing from seqid.
+Its name gives where the gap falls in seqid and the gap's alignment
+columns, as seqid:seqPos;aln:alnStart-alnEnd, with score 0 and no
+strand. Positions are in the records' coordinates: start and
+other_start are the offsets of the aligned regions in them.
+"""
+    return ['{}\t{}\t{}\t{}:{};aln:{}-{}\t0\t.\n'.format(
+                otherid, other_begin, other_end, seqid, pos, begin, end)
+            for begin, end, pos, other_begin, other_end
+            in zip(*indel_rows(aligned, other, size, start, other_start))]
+
+
+def alignment_bed_lines(alignment, size):
+    """Return the BED6 lines of the indels of both of the alignment's
+    sequences, in their records' coordinates"""
+    a, b, idA, idB = alignment.a, alignment.b, alignment.idA, alignment.idB
+    startA, startB = alignment.startA, alignment.startB
+    return (bed_lines(idA, idB, a, b, size, startA, startB) +
+            bed_lines(idB, idA, b, a, size, startB, startA))
+
+
+def table_lines(seqid, aligned, other, size, start=0, other_start=0):
+    """Return the TABLE_HEADER columns of the gap runs of aligned at
+    least size long, one tab-separated line per run"""
+    return ['{}\t{}\t{}\t{}\t{}\t{}\n'.format(seqid, *row)
+            for row in zip(*indel_rows(aligned, other, size, start,
+                                       other_start))]
+
+
+def write_bed(alignment, size, outdir=OUTDIR):
+    """Write outdir/indelRegions.bed, the indel regions as BED, and
+    outdir/indelRegions.tsv, the same regions with their alignment
+    columns"""
+    filename = os.path.join(outdir, 'indelRegions.bed')
+    table_filename = os.path.join(outdir, 'indelRegions.tsv')
+    a, b, idA, idB = alignment.a, alignment.b, alignment.idA, alignment.idB
+    startA, startB = alignment.startA, alignment.startB
+    with dotProfile.stage('bed') as record:
+        lines = alignment_bed_lines(alignment, size)
+        with open(filename, "w") as fil:
+            fil.write(''.join([BED_HEADER] + lines))
+        with open(table_filename, "w") as fil:
+            fil.write(''.join([TABLE_HEADER] +
+                              table_lines(idA, a, b, size, startA, startB) +
+                              table_lines(idB, b, a, size, startB, startA)))
+        record['regions'] = len(lines)
+    print("wrote", filename)
+    print("wrote", table_filename)
+    return filename
+
+
+def compute_points(seq1, seq2, window, threshold, engine='numpy',
+                   kmer_cap=1000, tile=dotEngine.TILE, outdir=OUTDIR,
+                   band=None, jobs=None, both_strands=False,
+                   matrix=dotEngine.MATRIX):
+    """Return the PointSet of seq1 against seq2 from a dotEngine engine;
+    the tiled engine writes a MappedPointSet to outdir/dotPoints.*"""
+    points_file = (os.path.join(outdir, POINTS_FILE)
+                   if engine == 'tiled' else None)
+    stats = {}
+    with dotProfile.stage('points', engine=engine) as record:
+        points = dotEngine.compute_points(seq1, seq2, window, threshold,
+                                          engine, kmer_cap, tile,
+                                          points_file, band, jobs,
+                                          both_strands, matrix, stats)
+        record['points'] = len(points)
+        record.update(stats)
+    if stats.get('fallback'):
+        print('seeded engine used window_points:', stats['fallback'],
+              file=sys.stderr)
+    return points
+
+
+def write_segments(points, outdir=OUTDIR):
+    """Write outdir/segments.tsv, the diagonal runs of the points, and
+    return the dotPoints.Segments"""
+    filename = os.path.join(outdir, 'segments.tsv')
+    with dotProfile.stage('segments') as record:
+        segments = Segments.from_points(points)
+        rows = ['{}\t{}\t{}\t{}\n'.format(x, y, length, CATEGORY_NAMES[cat])
+                for x, y, length, cat in segments]
+        with open(filename, 'w') as fil:
+            fil.write(''.join(['#x\ty\tlength\tcategory\n'] + rows))
+        record['segments'] = len(segments)
+    print("wrote", filename)
+    return segments
+
+
+def write_png(points, window, filename, scale=1.0, dot_size=1,
+              max_side=PNG_MAX_SIDE):
+    """Write the points as a PNG laid out like DotPlot's plot area.
+
+The scale is lowered so that neither side exceeds max_side pixels;
+rasterize then max-pools the points falling on one pixel, and the PNG
+is encoded a band of rows at a time, so the memory used stays bounded
+by max_side squared however long the sequences are.
+"""
+    extent = max(points.max_x, points.max_y) + window
+    if max_side and extent * scale > max_side:
+        scale = max_side / extent
+    width = round((points.max_x + window) * scale)
+    height = round((points.max_y + window) * scale)
+    with dotProfile.stage('png', width=width, height=height):
+        pixels = dotRaster.rasterize(points, width, height, scale,
+                                     y_offset=window, dot_size=dot_size)
+        dotRaster.write_pixels_png(filename, pixels)
+    print("wrote", filename)
+    return filename
+
+
+def write_vector(points, window, filename, seqname1='', seqname2=''):
+    """Write the plot, with axes and titles, as PostScript, SVG or PDF
+    according to the filename's extension, streaming the points"""
+    with dotProfile.stage('vector', points=len(points)):
+        return dotVector.export(filename, points, window,
+                                seqname1=seqname1, seqname2=seqname2)
+
+
+def write_vectors(points, window, formats, outdir=OUTDIR, seqname1='',
+                  seqname2=''):
+    """Write outdir/dotplot.<format> for each of formats"""
+    return [write_vector(points, window,
+                         os.path.join(outdir, 'dotplot.' + format),
+                         seqname1, seqname2)
+            for format in formats]
+
+
+def write_sweep(seq1, seq2, settings, outdir=OUTDIR):
+    """Write outdir/dotplot_w<window>_t<threshold>.png for each
+    (window, threshold) of settings, answering them all from one
+    dotEngine.DiagonalIndex (or with window_points when the sequences
+    are too long to index); returns {(window, threshold): points}"""
+    index = None
+    if dotEngine.DiagonalIndex.fits(len(seq1), len(seq2)):
+        with dotProfile.stage('sweep_index'):
+            index = dotEngine.DiagonalIndex(seq1, seq2)
+    counts = {}
+    for window, threshold in settings:
+        points = (index.points(window, threshold) if index else
+                  dotEngine.window_points(seq1, seq2, window, threshold))
+        write_png(points, window, os.path.join(
+            outdir, 'dotplot_w{}_t{}.png'.format(window, threshold)))
+        counts[window, threshold] = len(points)
+    return counts
+
+
+def show(seqAalign, seqBalign, window, threshold, outdir=OUTDIR,
+         **options):
+    """Open the interactive DotPlot window; this is what loads Tk"""
+    from ch11_dotplot import DotPlot
+    with dotProfile.stage('show'):
+        plot = DotPlot(seqAalign, seqBalign, window=window,
+                       threshold=threshold, with_axes=True,
+                       ps_filename=os.path.join(outdir, 'dotplot.ps'),
+                       ps_scale=0.6,
+                       points_filename=os.path.join(outdir, POINTS_FILE),
+                       **options)
+        plot.execute()
+    return plot
+
+
+def run_pair(seqAid, seqA, seqBid, seqB, indel_size, window, threshold,
+             outdir=OUTDIR, engine='numpy', kmer_cap=1000,
+             scoring=dotAlign.GLOBALXX, report=True, tile=dotEngine.TILE,
+             band=None, sweep=(), jobs=None, both_strands=False,
+             segments=False, vector=(), matrix=dotEngine.MATRIX,
+             starts=(0, 0)):
+    """Run the headless pipeline on two sequences and return its results.
+    The alignment report is written while the later stages run, or not
+    at all if report is false. sweep lists extra (window, threshold)
+    settings to write plots for; vector lists vector formats ('ps',
+    'svg', 'pdf') to also write the plot in. starts are the sequences'
+    offsets in their records, when they are regions of them."""
+    os.makedirs(outdir, exist_ok=True)
+    alignment = align(seqA, seqB, scoring, seqAid, seqBid, *starts)
+    report_thread = write_report(alignment, outdir) if report else None
+    write_bed(alignment, indel_size, outdir)
+    points = compute_points(alignment.a, alignment.b, window, threshold,
+                            engine, kmer_cap, tile, outdir, band, jobs,
+                            both_strands, matrix)
+    write_png(points, window, os.path.join(outdir, 'dotplot.png'))
+    write_vectors(points, window, vector, outdir, seqAid, seqBid)
+    segments = write_segments(points, outdir) if segments else None
+    sweep = (write_sweep(alignment.a, alignment.b, sweep, outdir)
+             if sweep else {})
+    finish_report(report_thread)
+    return SimpleNamespace(alignment=alignment, points=points, plot=None,
+                           sweep=sweep, segments=segments)
+
+
+def run(fasta_file, indel_size, window, threshold, outdir=OUTDIR,
+        engine='numpy', kmer_cap=1000, headless=True, renderer='canvas',
+        scoring=dotAlign.GLOBALXX, report=True, tile=dotEngine.TILE,
+        band=None, sweep=(), sliders=False, jobs=None, both_strands=False,
+        segments=False, vector=(), regions=(), progressive=False,
+        matrix=dotEngine.MATRIX):
+    """Run the whole pipeline and return its results.
+
+With headless=True (the default) the dot plot is written to
+outdir/dotplot.png and Tk is never imported; otherwise the DotPlot
+window is opened (drawn with renderer, with window and threshold
+sliders if sliders is true) and returned as result.plot. A plot is
+also written for each (window, threshold) of sweep, and as
+outdir/dotplot.<format> for each vector format. With regions, the
+first two regions of the file are compared instead of its first two
+records. With progressive, the window opens at once and draws the
+points as they are computed; result.points then fills in after run
+returns, and the vector files and segments.tsv are written once it is
+complete.
+"""
+    seqAid, seqA, seqBid, seqB, startA, startB = \
+        read_fasta_pair(fasta_file, regions)
+    if headless:
+        return run_pair(seqAid, seqA, seqBid, seqB, indel_size,
+                        window, threshold, outdir, engine, kmer_cap,
+                        scoring, report, tile, band, sweep, jobs,
+                        both_strands, segments, vector, matrix,
+                        (startA, startB))
+    os.makedirs(outdir, exist_ok=True)
+    alignment = align(seqA, seqB, scoring, seqAid, seqBid, startA, startB)
+    report_thread = write_report(alignment, outdir) if report else None
+    write_bed(alignment, indel_size, outdir)
+    sweep = (write_sweep(alignment.a, alignment.b, sweep, outdir)
+             if sweep else {})
+
+    def write_plot_files(plot):
+        write_vectors(plot.points, window, vector, outdir, seqAid, seqBid)
+        return (write_segments(plot.points, outdir) if segments
+                else plot.segments)
+
+    plot = show(alignment.alignedA, alignment.alignedB, window, threshold,
+                outdir, engine=engine, kmer_cap=kmer_cap, tile=tile,
+                band=band, jobs=jobs, both_strands=both_strands,
+                matrix=matrix, renderer=renderer,
+                sweep_controls=sliders, progressive=progressive,
+                on_complete=write_plot_files if progressive else None)
+    plot_segments = None if progressive else write_plot_files(plot)
+    finish_report(report_thread)
+    return SimpleNamespace(alignment=alignment, points=plot.points,
+                           plot=plot, sweep=sweep, segments=plot_segments)
@@ -1,109 +1,165 @@
-import tkinter
-from ch11_dotplot import DotPlot
-from Bio import pairwise2
-from Bio.pairwise2 import format_alignment
-from Bio import SeqIO
-import sys
-import os
+import time
+STARTED = time.perf_counter()     # reported as startup_seconds by --profile
 
-if __name__ == '__main__':
-    if len(sys.argv)!=5:
-        print("ERROR: Incorrect number of arguements")
-        print("USAGE:")
-        print("python3 dotPlotter.py <fasta_file> <indel size threshold> <window size> <count threshold>")
-        quit()
-
-    if not os.path.exists('dotPlotterOut'):
-        os.makedirs('dotPlotterOut')
+import argparse
+import sys
 
-    seqAid = ""
-    seqA = ""
-    seqBid = ""
-    seqB = ""
-    fasta_sequences = SeqIO.parse(open(sys.argv[1]),'fasta')
-    fastasRead = 0
-    for fasta in fasta_sequences:
-            if fastasRead == 0:
-                seqAid, seqA = fasta.id, str(fasta.seq)
-                fastasRead += 1
-            if fastasRead == 1:
-                seqBid, seqB = fasta.id, str(fasta.seq)
+import os
 
-    alignments = pairwise2.align.globalxx(seqA,seqB)
+import dotAlign
+import dotEngine
+import dotFasta
+import dotPipeline
+import dotProfile
+import dotVector
 
-    file = open("dotPlotterOut/alignmentInfo.txt", "w")
-    file.write( format_alignment(*alignments[0]) )
-    file.close()
-    print("wrote dotPlotterOut/alignmentInfo.txt")
+## Window = w, the length of the diagonal window from given point
+## Cutoff = c, the number of points in that given window
+## At each point, that point is compared to the next w-1 points, the total
+## Number of matches is counted. A match between two of the same neucleotide
+## is only regestered when the count is at least c.
+## Amino acid seq w=3 and t =2
+## Base sequences w=11 and c=7
 
-    file = open('dotPlotterOut/alignmentInfo.txt', 'r')
+def scoring_arg(text):
+    try:
+        match, mismatch, gap = map(int, text.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'expected three integers MATCH,MISMATCH,GAP')
+    return match, mismatch, gap
 
-    seqAalign = ""
-    seqBalign = ""
-    alignScore = 0
 
-    for i in range(1,5):
-        line = file.readline()
-        if( i == 1 ):
-            seqAalign = line
-        if( i == 3 ):
-            seqBalign = line
-        if( i == 4):
-            alignScore = int( line.replace('\n','')[8:len(line)] )
-    file.close()
+def sweep_arg(text):
+    try:
+        return [tuple(map(int, setting.split(':')))
+                for setting in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'expected WINDOW:THRESHOLD pairs separated by commas')
 
-    seqAalign = seqAalign.replace('\n', '')
-    seqBalign = seqBalign.replace('\n', '')
 
-    #Build BED File:
-    size = int(sys.argv[2])
-    file = open("dotPlotterOut/indelRegions.bed", "w")
-    startCount = False
-    start = 0
-    stop = 0
-    for i in range(len(seqAalign)):
-        if( seqAalign[i] == "-" and startCount == False):
-            startCount = True
-            start = i
-        if( seqAalign[i] != "-" and startCount == True):
-            startCount = False
-            stop = i
-            if( (stop-start) >= size):
-                file.write( seqAid + " " + str(start) + " " + str(stop) )
-                file.write( "\n" )
-    startCount = False
-    start = 0
-    stop = 0
-    for i in range(len(seqBalign)):
-        if( seqBalign[i] == "-" and startCount == False):
-            startCount = True
-            start = i
-        if( seqBalign[i] != "-" and startCount == True):
-            startCount = False
-            stop = i
-            if( (stop-start) >= size):
-                file.write( seqBid + " " + str(start) + " " + str(stop) )
-                file.write( "\n" )
-    file.close()
-    print("wrote dotPlotterOut/indelRegions.bed")
+def vector_arg(text):
+    formats = text.split(',')
+    for format in formats:
+        if format not in dotVector.FORMATS:
+            raise argparse.ArgumentTypeError(
+                'expected formats among {} separated by commas'.format(
+                    ','.join(dotVector.FORMATS)))
+    return formats
 
-    ## Window = w, the length of the diagonal window from given point
-    ## Cutoff = c, the number of points in that given window
-    ## At each point, that point is compared to the next w-1 points, the total
-    ## Number of matches is counted. A match between two of the same neucleotide
-    ## is only regestered when the count is at least c.
-    ## Amino acid seq w=3 and t =2
-    ## Base sequences w=11 and c=7
 
-    w = int(sys.argv[3])
-    t = int(sys.argv[4])
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='dotPlotter.py',
+        description='Align two sequences, write their indel regions '
+                    'and draw a dot plot of the alignment')
+    parser.add_argument('fasta_file')
+    parser.add_argument('indel_size', type=int,
+                        help='indel size threshold')
+    parser.add_argument('window', type=int, help='window size')
+    parser.add_argument('threshold', type=int, help='count threshold')
+    parser.add_argument('--headless', action='store_true',
+                        help='write dotplot.png instead of opening a '
+                             'window; tkinter is never imported')
+    parser.add_argument('--outdir', default=dotPipeline.OUTDIR)
+    parser.add_argument('--region', dest='regions', action='append',
+                        default=[], metavar='NAME[:START-END]',
+                        help='compare this region of the FASTA file '
+                             '(1-based, inclusive; give it twice for '
+                             'the two sequences)')
+    parser.add_argument('--engine', default='numpy',
+                        choices=dotEngine.ENGINES)
+    parser.add_argument('--kmer-cap', type=int, default=1000,
+                        help="seeded engine's limit on k-mer repeats")
+    parser.add_argument('--tile', type=int, default=dotEngine.TILE,
+                        help="tiled engine's tile size")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="parallel engine's worker processes "
+                             "(default: one per core)")
+    parser.add_argument('--matrix', default=dotEngine.MATRIX,
+                        help='substitution matrix of the scored engine, '
+                             'whose threshold is a window score '
+                             '(default: {}; also e.g. PAM250, BLOSUM45)'
+                             .format(dotEngine.MATRIX))
+    parser.add_argument('--both-strands', action='store_true',
+                        help='also plot reverse-complement (inverted '
+                             'repeat) matches, in blue; numpy engine only')
+    parser.add_argument('--band', type=int, default=None,
+                        help="banded engine's band half-width (default: "
+                             "from the longest gap run)")
+    parser.add_argument('--scoring', type=scoring_arg,
+                        default=dotAlign.GLOBALXX,
+                        metavar='MATCH,MISMATCH,GAP',
+                        help='alignment scores (default: 1,0,0 as '
+                             'globalxx)')
+    parser.add_argument('--no-report', dest='report',
+                        action='store_false',
+                        help='do not write alignmentInfo.txt')
+    parser.add_argument('--renderer', default='canvas',
+                        choices=('canvas', 'raster', 'tiles'))
+    parser.add_argument('--sweep', type=sweep_arg, default=(),
+                        metavar='W:T[,W:T...]',
+                        help='also write dotplot_wW_tT.png for each '
+                             'window and threshold, from one index')
+    parser.add_argument('--profile', nargs='?', const='', metavar='FILE',
+                        help='write the time and memory used by each '
+                             'stage as JSON (default: profile.json in '
+                             'the output directory)')
+    parser.add_argument('--cprofile', metavar='STAGE',
+                        help='with --profile, also run STAGE (e.g. '
+                             'align, points, draw) under cProfile')
+    parser.add_argument('--segments', action='store_true',
+                        help='also write segments.tsv, the diagonal runs '
+                             'of dots')
+    parser.add_argument('--vector', type=vector_arg, default=(),
+                        metavar='FORMATS',
+                        help='also write dotplot.ps, .svg and/or .pdf, '
+                             'in colour, e.g. --vector svg,pdf')
+    parser.add_argument('--progressive', action='store_true',
+                        help='open the window at once and draw the dots '
+                             'as they are computed, with a cancel button '
+                             '(numpy engine only)')
+    parser.add_argument('--sliders', action='store_true',
+                        help='add window and threshold sliders to the '
+                             'window')
+    return parser.parse_args(argv)
 
 
-    plot = DotPlot(seqAalign, seqBalign, window=w, threshold=t, with_axes=True,
-                   ps_filename='dotPlotterOut/dotplot.ps', ps_scale=0.6)
-    plot.execute()
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    if args.profile is not None:
+        dotProfile.start(args.cprofile,
+                         startup_seconds=time.perf_counter() - STARTED)
     try:
-        sys.ps1                     # are we running interactively?
-    except:                         # no
-        input("Press the Return key to close the window(s)")
-        plot.close()
+        result = dotPipeline.run(args.fasta_file, args.indel_size,
+                                 args.window, args.threshold,
+                                 outdir=args.outdir,
+                                 engine=args.engine,
+                                 kmer_cap=args.kmer_cap,
+                                 tile=args.tile,
+                                 band=args.band,
+                                 jobs=args.jobs,
+                                 both_strands=args.both_strands,
+                                 matrix=args.matrix,
+                                 segments=args.segments,
+                                 vector=args.vector,
+                                 regions=args.regions,
+                                 sweep=args.sweep,
+                                 sliders=args.sliders,
+                                 progressive=args.progressive,
+                                 scoring=args.scoring,
+                                 report=args.report,
+                                 headless=args.headless,
+                                 renderer=args.renderer)
+    except (dotFasta.UnknownSequence, dotFasta.BadRegion) as error:
+        sys.exit('dotPlotter.py: error: {}'.format(error))
+    if args.profile is not None:
+        dotProfile.stop().write(args.profile or
+                                os.path.join(args.outdir, 'profile.json'))
+    if not args.headless:
+        try:
+            sys.ps1                     # are we running interactively?
+        except:                         # no
+            input("Press the Return key to close the window(s)")
+            result.plot.close()
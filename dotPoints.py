@@ -0,0 +1,308 @@
+"""Columnar storage for dot plot points
+
+Points are kept per category as a pair of int32 columns (x and y)
+instead of a list of Python tuples, so each point costs 8 bytes. The
+bounds of the whole set are tracked as points are added. PointSet
+keeps the columns in memory; MappedPointSet appends them to files and
+reads them back through memory maps, so that the points of a large
+comparison never have to fit in memory at once. Segments compresses a
+point set into runs of adjacent points along diagonals.
+"""
+
+from array import array
+import json
+
+import numpy as np
+
+# point categories, in drawing order
+MATCH = 0           # identical window starting on a seq2 character
+GAP_MATCH = 1       # identical window starting on a seq2 gap
+INDEL = 2           # main-diagonal window of seq1 gaps against seq2
+REVERSE = 3         # window of seq1 identical to the reverse complement
+                    # of a window of seq2
+CATEGORIES = (MATCH, GAP_MATCH, INDEL)
+BOTH_STRANDS = CATEGORIES + (REVERSE,)
+CATEGORY_NAMES = ('match', 'gap match', 'indel', 'reverse')
+# y step from one point of a run to the next, for each category:
+# reverse-strand runs go down the anti-diagonals
+CATEGORY_SLOPES = (1, 1, 1, -1)
+
+
+def int32_column():
+    col = array('i')
+    assert col.itemsize == 4
+    return col
+
+
+class PointSet:
+
+    """Dot plot points grouped by category.
+
+    append(category, x, y) adds one point; extend(category, xs, ys)
+    adds a whole array of them. xs(category) and ys(category) return
+    the columns as int32 NumPy arrays that share the underlying
+    storage. max_x and max_y are the largest coordinates seen so far,
+    or 0 if the set is empty.
+"""
+
+    def __init__(self, categories=CATEGORIES):
+        self.categories = tuple(categories)
+        self._xs = {cat: int32_column() for cat in self.categories}
+        self._ys = {cat: int32_column() for cat in self.categories}
+        self.max_x = self.max_y = 0
+
+    def append(self, category, x, y):
+        self._xs[category].append(x)
+        self._ys[category].append(y)
+        if x > self.max_x:
+            self.max_x = x
+        if y > self.max_y:
+            self.max_y = y
+
+    def extend(self, category, xs, ys):
+        if not len(xs):
+            return
+        xs = np.asarray(xs, dtype=np.int32)
+        ys = np.asarray(ys, dtype=np.int32)
+        self._xs[category].frombytes(xs.tobytes())
+        self._ys[category].frombytes(ys.tobytes())
+        self.max_x = max(self.max_x, int(xs.max()))
+        self.max_y = max(self.max_y, int(ys.max()))
+
+    def xs(self, category):
+        return np.frombuffer(self._xs[category], dtype=np.int32)
+
+    def ys(self, category):
+        return np.frombuffer(self._ys[category], dtype=np.int32)
+
+    def count(self, category):
+        return len(self._xs[category])
+
+    def __len__(self):
+        return sum(self.count(cat) for cat in self.categories)
+
+    def chunks(self, category, size=1 << 20):
+        """Yield the category's points as (xs, ys) arrays of at most
+        size points each"""
+        xs, ys = self.xs(category), self.ys(category)
+        for start in range(0, len(xs), size):
+            yield xs[start:start+size], ys[start:start+size]
+
+    def __iter__(self):
+        """Yield (x, y, category) for every point, category by category"""
+        for cat in self.categories:
+            for xs, ys in self.chunks(cat):
+                for x, y in zip(xs.tolist(), ys.tolist()):
+                    yield x, y, cat
+
+    def nbytes(self):
+        return 8 * len(self)
+
+    def sorted(self):
+        """Return an in-memory copy with each category in row-major
+        (y, x) order"""
+        result = PointSet(self.categories)
+        for cat in self.categories:
+            xs, ys = np.array(self.xs(cat)), np.array(self.ys(cat))
+            order = np.lexsort((xs, ys))
+            result.extend(cat, xs[order], ys[order])
+        return result
+
+    def __eq__(self, other):
+        """Point sets are equal if they hold the same points in the
+        same categories, in any order"""
+        if not isinstance(other, PointSet):
+            return NotImplemented
+        if self.categories != other.categories:
+            return False
+        mine, theirs = self.sorted(), other.sorted()
+        return all(np.array_equal(mine.xs(cat), theirs.xs(cat)) and
+                   np.array_equal(mine.ys(cat), theirs.ys(cat))
+                   for cat in self.categories)
+
+    def __repr__(self):
+        return '<PointSet {}>'.format(', '.join(
+            '{}={}'.format(CATEGORY_NAMES[cat], self.count(cat))
+            for cat in self.categories))
+
+
+class MappedPointSet(PointSet):
+
+    """A PointSet stored in files.
+
+    Each category's points are appended to path.<category>.xy as
+    interleaved x, y int32 pairs, and the counts and bounds to
+    path.json when the set is closed. Opened with mode 'r', the files
+    are memory-mapped: xs(), ys() and chunks() only page in the points
+    they touch.
+"""
+
+    def __init__(self, path, mode='r', categories=CATEGORIES):
+        if mode not in ('r', 'w'):
+            raise ValueError("mode must be 'r' or 'w'")
+        self.path = path
+        self.mode = mode
+        if mode == 'w':
+            self.categories = tuple(categories)
+            self.max_x = self.max_y = 0
+            self.counts = {cat: 0 for cat in self.categories}
+            self.files = {cat: open(self.category_filename(cat), 'wb')
+                          for cat in self.categories}
+        else:
+            with open(path + '.json') as fil:
+                meta = json.load(fil)
+            self.categories = tuple(meta['categories'])
+            self.max_x, self.max_y = meta['max_x'], meta['max_y']
+            self.counts = {cat: count for cat, count in
+                           zip(self.categories, meta['counts'])}
+            self.files = None
+        self.maps = {}
+
+    def category_filename(self, category):
+        return '{}.{}.xy'.format(self.path,
+                                 CATEGORY_NAMES[category].replace(' ', '_'))
+
+    def append(self, category, x, y):
+        self.extend(category, [x], [y])
+
+    def extend(self, category, xs, ys):
+        if self.mode != 'w':
+            raise ValueError('MappedPointSet is not open for writing')
+        if not len(xs):
+            return
+        pairs = np.empty((len(xs), 2), dtype=np.int32)
+        pairs[:, 0] = xs
+        pairs[:, 1] = ys
+        self.files[category].write(pairs.tobytes())
+        self.counts[category] += len(pairs)
+        self.max_x = max(self.max_x, int(pairs[:, 0].max()))
+        self.max_y = max(self.max_y, int(pairs[:, 1].max()))
+
+    def close(self):
+        """Finish writing and reopen the set for reading"""
+        if self.mode == 'w':
+            for fil in self.files.values():
+                fil.close()
+            with open(self.path + '.json', 'w') as fil:
+                json.dump({'categories': self.categories,
+                           'counts': [self.counts[cat]
+                                      for cat in self.categories],
+                           'max_x': self.max_x, 'max_y': self.max_y}, fil)
+            self.files = None
+            self.mode = 'r'
+        return self
+
+    def pairs(self, category):
+        """Return the category's memory-mapped (n, 2) array of points"""
+        if self.mode != 'r':
+            raise ValueError('MappedPointSet must be closed before reading')
+        if category not in self.maps:
+            if self.counts[category]:
+                self.maps[category] = np.memmap(
+                    self.category_filename(category), dtype=np.int32,
+                    mode='r', shape=(self.counts[category], 2))
+            else:
+                self.maps[category] = np.zeros((0, 2), dtype=np.int32)
+        return self.maps[category]
+
+    def xs(self, category):
+        return self.pairs(category)[:, 0]
+
+    def ys(self, category):
+        return self.pairs(category)[:, 1]
+
+    def count(self, category):
+        return self.counts[category]
+
+    def chunks(self, category, size=1 << 20):
+        pairs = self.pairs(category)
+        for start in range(0, len(pairs), size):
+            block = np.array(pairs[start:start+size])
+            yield block[:, 0], block[:, 1]
+
+
+class Segments:
+
+    """Dot plot points as diagonal runs.
+
+    Each run of points (x, y), (x + 1, y + slope), ... of one category
+    is kept as its first point and its length, in int32 columns per
+    category; slope is CATEGORY_SLOPES[category]. Iterating yields
+    (x, y, length, category).
+"""
+
+    def __init__(self, categories=CATEGORIES):
+        self.categories = tuple(categories)
+        empty = np.zeros(0, dtype=np.int32)
+        self.columns = {cat: (empty, empty, empty)
+                        for cat in self.categories}
+
+    @classmethod
+    def from_points(cls, points):
+        """Return the Segments of a PointSet"""
+        segments = cls(points.categories)
+        for cat in points.categories:
+            segments.columns[cat] = cls.runs(
+                np.asarray(points.xs(cat)), np.asarray(points.ys(cat)),
+                CATEGORY_SLOPES[cat])
+        return segments
+
+    @staticmethod
+    def runs(xs, ys, slope=1):
+        """Return (xs, ys, lengths) of the runs of the points"""
+        if not len(xs):
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty, empty
+        diagonal = xs.astype(np.int64) - slope * ys.astype(np.int64)
+        order = np.lexsort((xs, diagonal))
+        xs, ys, diagonal = xs[order], ys[order], diagonal[order]
+        starts = np.flatnonzero(np.concatenate((
+            [True], (diagonal[1:] != diagonal[:-1]) |
+                    (xs[1:] != xs[:-1] + 1))))
+        lengths = np.diff(np.append(starts, len(xs)))
+        return (xs[starts].astype(np.int32), ys[starts].astype(np.int32),
+                lengths.astype(np.int32))
+
+    def xs(self, category):
+        return self.columns[category][0]
+
+    def ys(self, category):
+        return self.columns[category][1]
+
+    def lengths(self, category):
+        return self.columns[category][2]
+
+    def count(self, category):
+        return len(self.columns[category][0])
+
+    def __len__(self):
+        return sum(self.count(cat) for cat in self.categories)
+
+    def points(self):
+        """Return the number of points the segments stand for"""
+        return sum(int(self.lengths(cat).sum()) for cat in self.categories)
+
+    def __iter__(self):
+        for cat in self.categories:
+            for x, y, length in zip(*(col.tolist()
+                                      for col in self.columns[cat])):
+                yield x, y, length, cat
+
+    def to_points(self):
+        """Return the PointSet the segments were made from"""
+        points = PointSet(self.categories)
+        for cat in self.categories:
+            xs, ys, lengths = self.columns[cat]
+            if not len(xs):
+                continue
+            step = np.arange(int(lengths.sum())) - np.repeat(
+                np.cumsum(lengths) - lengths, lengths)
+            points.extend(cat, np.repeat(xs, lengths) + step,
+                          np.repeat(ys, lengths) +
+                          CATEGORY_SLOPES[cat] * step)
+        return points
+
+    def __repr__(self):
+        return '<Segments {}>'.format(', '.join(
+            '{}={}'.format(CATEGORY_NAMES[cat], self.count(cat))
+            for cat in self.categories))
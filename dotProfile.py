@@ -0,0 +1,126 @@
+"""Per-stage timing and memory instrumentation
+
+The pipeline stages and the Plot framework methods are wrapped in
+stage(name) blocks. They cost nothing unless a Profiler has been
+started, in which case every block records its wall time, CPU time,
+the process's peak RSS when it finished, and whatever the block adds
+to the record it is given (point counts, canvas item counts):
+
+    profiler = dotProfile.start(cprofile_stage='points')
+    dotPipeline.run('test.fasta', 9, 11, 7)
+    dotProfile.stop().write('profile.json')
+
+The stage named by cprofile_stage is also run under cProfile and its
+hottest functions are included in the report. dotPlotter.py passes the
+time its imports took as startup_seconds, which is reported too.
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+
+try:
+    import resource
+except ImportError:                     # not on Windows
+    resource = None
+
+
+def peak_rss():
+    """Return the peak resident set size of the process in bytes,
+    or None where it is not available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+
+    """Records of the stages run while it is active.
+
+    stages lists a dict per finished stage, inner stages before the
+    ones enclosing them; each names its enclosing stage as parent.
+"""
+
+    def __init__(self, cprofile_stage=None, cprofile_top=25,
+                 startup_seconds=None):
+        self.cprofile_stage = cprofile_stage
+        self.startup_seconds = startup_seconds
+        self.cprofile_top = cprofile_top
+        self.stages = []
+        self.open_stages = []
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        record = dict(name=name,
+                      parent=(self.open_stages[-1]['name']
+                              if self.open_stages else None),
+                      **info)
+        self.open_stages.append(record)
+        profile = (cProfile.Profile() if name == self.cprofile_stage
+                   else None)
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profile:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile:
+                profile.disable()
+            record['wall_seconds'] = time.perf_counter() - wall
+            record['cpu_seconds'] = time.process_time() - cpu
+            record['peak_rss_bytes'] = peak_rss()
+            if profile:
+                record['cprofile'] = self.profile_text(profile)
+            self.open_stages.pop()
+            self.stages.append(record)
+
+    def profile_text(self, profile):
+        out = io.StringIO()
+        stats = pstats.Stats(profile, stream=out)
+        stats.sort_stats('cumulative').print_stats(self.cprofile_top)
+        return out.getvalue()
+
+    def report(self):
+        return {'startup_seconds': self.startup_seconds,
+                'wall_seconds': time.perf_counter() - self.start_wall,
+                'cpu_seconds': time.process_time() - self.start_cpu,
+                'peak_rss_bytes': peak_rss(),
+                'stages': self.stages}
+
+    def write(self, filename):
+        with open(filename, 'w') as fil:
+            json.dump(self.report(), fil, indent=1)
+        print('wrote', filename)
+        return filename
+
+
+active = None
+
+
+def start(cprofile_stage=None, startup_seconds=None):
+    """Start recording stages and return the Profiler"""
+    global active
+    active = Profiler(cprofile_stage, startup_seconds=startup_seconds)
+    return active
+
+
+def stop():
+    """Stop recording stages and return the Profiler"""
+    global active
+    profiler, active = active, None
+    return profiler
+
+
+def stage(name, **info):
+    """Return a context manager recording the stage name if a Profiler
+    is active; it yields the stage's record, a dict"""
+    if active is None:
+        return contextlib.nullcontext({})
+    return active.stage(name, **info)
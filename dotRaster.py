@@ -0,0 +1,195 @@
+"""Raster rendering of dot plot points
+
+Instead of creating one canvas item per dot, the points are painted
+into a pixel buffer the size of the plot. Each pixel holds the
+highest category painted into it (0 is background), so when there are
+more points than pixels they are max-pooled with the same precedence
+the canvas drawing order gives them. The buffer can be shown as a
+single tkinter PhotoImage or saved as a PNG file.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+# RGB colour of each pixel value: background, then point category + 1
+BACKGROUND = (255, 255, 255)
+CATEGORY_COLOURS = ((0, 0, 0),          # MATCH       black
+                    (255, 0, 0),        # GAP_MATCH   red
+                    (0, 255, 0),        # INDEL       green
+                    (0, 0, 255))        # REVERSE     blue
+
+
+def rasterize(points, width, height, scale=1.0, x_offset=0, y_offset=0,
+              dot_size=1, pixels=None):
+    """Return a height x width uint8 array of the points' categories + 1.
+
+The point (x, y) covers the dot_size x dot_size pixels whose top left
+corner is at column round((x + x_offset) * scale), row
+round((y + y_offset) * scale); row 0 is the top of the plot. The
+points are read a chunk at a time, so a MappedPointSet is never loaded
+whole. Given pixels, an array from an earlier call, the points are
+painted into it instead.
+"""
+    if pixels is None:
+        pixels = np.zeros((height, width), dtype=np.uint8)
+    for cat in points.categories:
+        for xs, ys in points.chunks(cat):
+            cols = np.rint((xs + x_offset) * scale).astype(np.int64)
+            rows = np.rint((ys + y_offset) * scale).astype(np.int64)
+            for dy in range(dot_size):
+                for dx in range(dot_size):
+                    r, c = rows + dy, cols + dx
+                    ok = (r >= 0) & (r < height) & (c >= 0) & (c < width)
+                    r, c = r[ok], c[ok]
+                    pixels[r, c] = np.maximum(pixels[r, c], cat + 1)
+    return pixels
+
+
+def colourize(pixels, background=BACKGROUND, colours=CATEGORY_COLOURS):
+    """Return a height x width x 3 RGB image of a rasterized plot"""
+    palette = np.array((background,) + tuple(colours), dtype=np.uint8)
+    return palette[pixels]
+
+
+def ppm_bytes(rgb):
+    """Return an RGB image as binary PPM data, which tkinter's
+    PhotoImage reads without any extra library"""
+    height, width = rgb.shape[:2]
+    header = 'P6 {} {} 255\n'.format(width, height).encode('ascii')
+    return header + np.ascontiguousarray(rgb).tobytes()
+
+
+def png_chunk(tag, data):
+    """Return one PNG chunk: length, tag, data and CRC"""
+    return (struct.pack('>I', len(data)) + tag + data +
+            struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+
+def png_parts(height, width, bands, level=6):
+    """Yield a PNG file a piece at a time from bands, a sequence of
+    RGB arrays of consecutive rows, so that only one band of the image
+    is ever held as RGB and as filtered rows at once"""
+    yield b'\x89PNG\r\n\x1a\n'
+    yield png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                         8, 2, 0, 0, 0))
+    compressor = zlib.compressobj(level)
+    for rgb in bands:
+        rows = np.zeros((len(rgb), 1 + 3 * width), dtype=np.uint8)
+        rows[:, 1:] = rgb.reshape(len(rgb), 3 * width)  # filter type 0
+        data = compressor.compress(rows.tobytes())
+        if data:
+            yield png_chunk(b'IDAT', data)
+    yield png_chunk(b'IDAT', compressor.flush())
+    yield png_chunk(b'IEND', b'')
+
+
+def png_bytes(rgb, level=6):
+    """Return an RGB image encoded as a PNG file"""
+    height, width = rgb.shape[:2]
+    return b''.join(png_parts(height, width, [rgb], level))
+
+
+def write_png(filename, rgb, band_rows=256):
+    """Write an RGB image as a PNG file, band_rows rows at a time"""
+    height, width = rgb.shape[:2]
+    bands = (rgb[i:i + band_rows] for i in range(0, height, band_rows))
+    with open(filename, 'wb') as fil:
+        fil.writelines(png_parts(height, width, bands))
+
+
+def write_pixels_png(filename, pixels, band_rows=256,
+                     background=BACKGROUND, colours=CATEGORY_COLOURS):
+    """Write rasterized pixels as a PNG file, colourizing band_rows
+    rows at a time instead of the whole RGB image at once"""
+    height, width = pixels.shape
+    bands = (colourize(pixels[i:i + band_rows], background, colours)
+             for i in range(0, height, band_rows))
+    with open(filename, 'wb') as fil:
+        fil.writelines(png_parts(height, width, bands))
+
+
+class DensityPyramid:
+
+    """Dot densities of a plot at successively halved resolutions.
+
+    Level 0 counts the points covering each pixel of the plot (or each
+    base x base block of pixels, base being the smallest power of two
+    that keeps level 0 under max_cells cells); each further level sums
+    2 x 2 blocks of the one below until the plot fits in one tile. Each
+    cell also keeps the highest category covering it. tile_rgb renders
+    one tile x tile piece of a level, so the cost of showing a view
+    depends only on the size of the view.
+"""
+
+    def __init__(self, points, width, height, scale=1.0, x_offset=0,
+                 y_offset=0, dot_size=1, tile=256, max_cells=1 << 24):
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self.base = 1
+        while (-(-width // self.base)) * (-(-height // self.base)) > \
+                max_cells:
+            self.base *= 2
+        shape = (-(-height // self.base), -(-width // self.base))
+        counts = np.zeros(shape, dtype=np.uint32)
+        top = np.zeros(shape, dtype=np.uint8)
+        for cat in points.categories:
+            for xs, ys in points.chunks(cat):
+                cols = np.rint((xs + x_offset) * scale).astype(np.int64)
+                rows = np.rint((ys + y_offset) * scale).astype(np.int64)
+                for dy in range(dot_size):
+                    for dx in range(dot_size):
+                        r, c = rows + dy, cols + dx
+                        ok = ((r >= 0) & (r < height) &
+                              (c >= 0) & (c < width))
+                        cell = (r[ok] // self.base, c[ok] // self.base)
+                        np.add.at(counts, cell, 1)
+                        np.maximum.at(top, cell, cat + 1)
+        self.levels = [(counts, top)]
+        while max(counts.shape) > tile:
+            counts, top = self.halve(counts, top)
+            self.levels.append((counts, top))
+        self.peaks = [max(int(counts.max()), 1) if counts.size else 1
+                      for counts, top in self.levels]
+
+    @staticmethod
+    def halve(counts, top):
+        """Return the next level up: sums and maxima of 2 x 2 blocks"""
+        h, w = counts.shape
+        counts = np.pad(counts, ((0, h % 2), (0, w % 2)))
+        top = np.pad(top, ((0, h % 2), (0, w % 2)))
+        counts = (counts[0::2, 0::2] + counts[1::2, 0::2] +
+                  counts[0::2, 1::2] + counts[1::2, 1::2])
+        top = np.maximum(np.maximum(top[0::2, 0::2], top[1::2, 0::2]),
+                         np.maximum(top[0::2, 1::2], top[1::2, 1::2]))
+        return counts, top
+
+    def shape(self, level):
+        """Return (height, width) of level in cells"""
+        return self.levels[level][0].shape
+
+    def fit_level(self, width, height):
+        """Return the finest level that fits in width x height"""
+        for level in range(len(self.levels)):
+            h, w = self.shape(level)
+            if w <= width and h <= height:
+                return level
+        return len(self.levels) - 1
+
+    def tile_rgb(self, level, row, col, background=BACKGROUND,
+                 colours=CATEGORY_COLOURS):
+        """Return the RGB image of tile (row, col) of level: each cell
+        gets the colour of its highest category, faded towards the
+        background the fewer points it holds"""
+        counts, top = self.levels[level]
+        t = self.tile
+        counts = counts[row*t:(row+1)*t, col*t:(col+1)*t]
+        top = top[row*t:(row+1)*t, col*t:(col+1)*t]
+        alpha = np.log1p(counts) / np.log1p(self.peaks[level])
+        alpha = np.where(counts > 0, 0.35 + 0.65 * alpha, 0.0)
+        bg = np.array(background, dtype=np.float64)
+        colour = colourize(top, background, colours).astype(np.float64)
+        rgb = bg + (colour - bg) * alpha[:, :, None]
+        return np.rint(rgb).astype(np.uint8)
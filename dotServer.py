@@ -0,0 +1,416 @@
+"""A local dot plot server that keeps its work in memory
+
+    python3 dotServer.py --port 8765 --memory 2048
+    python3 dotServer.py --socket /tmp/dotplot.sock
+
+Every dotPlotter.py run reads, aligns and computes from nothing. The
+server keeps what it computes in one LRU cache with a memory budget:
+the sequences read from a FASTA file (or regions of it, see
+dotFasta), their alignment as encoded arrays, the alignment's
+dotEngine.DiagonalIndex, the point set of each window and threshold,
+and the density pyramid and PNG tiles of each plot. A repeated request
+is answered from the cache, and a new window or threshold on a known
+pair only costs a pass over the index (or, for pairs too long to
+index, a window_points run). Requests are served on threads;
+concurrent requests needing the same value wait for a single
+computation of it.
+
+All requests are GETs naming the pair with fasta=FILE (relative to
+--root) and optionally region=NAME[:START-END] (given once or twice)
+and scoring=MATCH,MISMATCH,GAP:
+
+    /align                          JSON: ids, score, aligned sequences
+    /bed?indel_size=N               the BED lines of indelRegions.bed
+    /points?window=W&threshold=T    JSON: the points, column per category
+    /pyramid?window=W&threshold=T   JSON: size and shape of each level
+    /tile?window=W&threshold=T&level=L&row=R&col=C      PNG tile
+    /stats                          JSON: cache use, hits and misses
+
+It only listens on localhost or a Unix socket and needs no other
+service; DotServer.handle() answers a request without any socket.
+"""
+
+import argparse
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from urllib.parse import parse_qs, urlsplit
+
+import dotAlign
+import dotEngine
+import dotPipeline
+import dotRaster
+from dotPoints import CATEGORY_NAMES
+
+MEGABYTE = 1 << 20
+DEFAULT_MEMORY = 1024           # cache budget in megabytes
+
+
+def sizeof(value):
+    """Return the approximate memory held by a cached value in bytes"""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(item) for item in value)
+    if isinstance(value, dotAlign.Alignment):
+        return value.a.nbytes + value.b.nbytes
+    if isinstance(value, dotRaster.DensityPyramid):
+        return sum(counts.nbytes + top.nbytes
+                   for counts, top in value.levels)
+    nbytes = getattr(value, 'nbytes', None)
+    if nbytes is not None:
+        return nbytes() if callable(nbytes) else nbytes
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+
+    """Values kept within budget bytes, least recently used dropped first.
+
+    get(key, compute) returns the cached value of key, or stores and
+    returns compute(). While one thread computes a key, other threads
+    asking for it wait for that result instead of computing it again.
+    A value larger than the whole budget is returned but not kept.
+"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.entries = OrderedDict()        # key: (value, size)
+        self.pending = {}                   # key: threading.Event
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, compute):
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key][0]
+                done = self.pending.get(key)
+                if done is None:
+                    done = self.pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            done.wait()
+        try:
+            value = compute()
+            size = sizeof(value)
+            with self.lock:
+                if size <= self.budget:
+                    self.entries[key] = (value, size)
+                    self.used += size
+                    while self.used > self.budget:
+                        _, (_, dropped) = self.entries.popitem(last=False)
+                        self.used -= dropped
+                        self.evictions += 1
+            return value
+        finally:
+            with self.lock:
+                del self.pending[key]
+            done.set()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'used_bytes': self.used,
+                    'budget_bytes': self.budget, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+
+class RequestError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class DotServer:
+
+    """The cached pipeline behind the HTTP handler.
+
+    Each layer (sequences, alignment, index, points, pyramid, tile) is
+    cached under a key made of the pair's key and its own parameters;
+    the pair's key includes the FASTA file's modification time, so an
+    edited file is read again.
+"""
+
+    def __init__(self, root='.', memory=DEFAULT_MEMORY):
+        self.root = os.path.realpath(root)
+        self.cache = LRUCache(memory * MEGABYTE)
+        self.routes = {'/align': self.get_align, '/bed': self.get_bed,
+                       '/points': self.get_points,
+                       '/pyramid': self.get_pyramid,
+                       '/tile': self.get_tile, '/stats': self.get_stats}
+
+    ## request parameters
+
+    @staticmethod
+    def int_param(params, name, default=None):
+        if name not in params:
+            if default is None:
+                raise RequestError(400, 'missing parameter: ' + name)
+            return default
+        try:
+            return int(params[name][0])
+        except ValueError:
+            raise RequestError(400, 'expected an integer: ' + name)
+
+    def pair_key(self, params):
+        """Return (path, modification time, regions, scoring)"""
+        if 'fasta' not in params:
+            raise RequestError(400, 'missing parameter: fasta')
+        path = os.path.realpath(os.path.join(self.root,
+                                             params['fasta'][0]))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise RequestError(403, 'outside the served directory')
+        if not os.path.isfile(path):
+            raise RequestError(404, 'no such file: ' + params['fasta'][0])
+        try:
+            scoring = tuple(int(score) for score in
+                            params.get('scoring', ['1,0,0'])[0].split(','))
+        except ValueError:
+            scoring = ()
+        if len(scoring) != 3:
+            raise RequestError(400, 'expected scoring=MATCH,MISMATCH,GAP')
+        return (path, os.path.getmtime(path),
+                tuple(params.get('region', ())[:2]), scoring)
+
+    def plot_params(self, params):
+        window = self.int_param(params, 'window')
+        if window < 1:
+            raise RequestError(400, 'window must be at least 1')
+        return window, self.int_param(params, 'threshold')
+
+    ## cached layers
+
+    def sequences(self, pair):
+        path, _, regions, _ = pair
+
+        def read():
+            try:
+                return dotPipeline.read_fasta_pair(path, regions)
+            except KeyError as error:
+                raise RequestError(404, error.args[0])
+            except ValueError as error:
+                raise RequestError(400, str(error))
+        return self.cache.get(('sequences',) + pair[:3], read)
+
+    def alignment(self, pair):
+        def align():
+            seqAid, seqA, seqBid, seqB, startA, startB = \
+                self.sequences(pair)
+            return dotPipeline.align(seqA, seqB, pair[3], seqAid, seqBid,
+                                     startA, startB)
+        return self.cache.get(('alignment',) + pair, align)
+
+    def index(self, pair):
+        def build():
+            alignment = self.alignment(pair)
+            return dotEngine.DiagonalIndex(alignment.a, alignment.b)
+        return self.cache.get(('index',) + pair, build)
+
+    def points(self, pair, window, threshold):
+        def compute():
+            alignment = self.alignment(pair)
+            if not dotEngine.DiagonalIndex.fits(len(alignment.a),
+                                                len(alignment.b)):
+                return dotEngine.window_points(alignment.a, alignment.b,
+                                               window, threshold)
+            return self.index(pair).points(window, threshold)
+        return self.cache.get(('points',) + pair + (window, threshold),
+                              compute)
+
+    def pyramid(self, pair, window, threshold):
+        """The density pyramid of the plot, laid out like DotPlot's"""
+        def build():
+            points = self.points(pair, window, threshold)
+            return dotRaster.DensityPyramid(points, points.max_x + window,
+                                            points.max_y + window,
+                                            y_offset=window)
+        return self.cache.get(('pyramid',) + pair + (window, threshold),
+                              build)
+
+    ## routes
+
+    def get_align(self, params):
+        alignment = self.alignment(self.pair_key(params))
+        return self.json({'idA': alignment.idA, 'idB': alignment.idB,
+                          'score': alignment.score, 'length': len(alignment),
+                          'alignedA': alignment.alignedA,
+                          'alignedB': alignment.alignedB})
+
+    def get_bed(self, params):
+        pair = self.pair_key(params)
+        size = self.int_param(params, 'indel_size', 1)
+
+        def lines():
+            return ''.join([dotPipeline.BED_HEADER] +
+                           dotPipeline.alignment_bed_lines(
+                               self.alignment(pair), size))
+        text = self.cache.get(('bed',) + pair + (size,), lines)
+        return 200, 'text/tab-separated-values', text.encode('latin-1')
+
+    def get_points(self, params):
+        window, threshold = self.plot_params(params)
+        points = self.points(self.pair_key(params), window, threshold)
+        return self.json({
+            'window': window, 'threshold': threshold,
+            'max_x': points.max_x, 'max_y': points.max_y,
+            'points': {CATEGORY_NAMES[cat]: {'x': points.xs(cat).tolist(),
+                                             'y': points.ys(cat).tolist()}
+                       for cat in points.categories}})
+
+    def get_pyramid(self, params):
+        pyramid = self.pyramid(self.pair_key(params),
+                               *self.plot_params(params))
+        return self.json({'width': pyramid.width, 'height': pyramid.height,
+                          'tile': pyramid.tile, 'base': pyramid.base,
+                          'levels': [list(pyramid.shape(level)) for level
+                                     in range(len(pyramid.levels))]})
+
+    def get_tile(self, params):
+        pair = self.pair_key(params)
+        window, threshold = self.plot_params(params)
+        level, row, col = (self.int_param(params, name)
+                           for name in ('level', 'row', 'col'))
+
+        def render():
+            pyramid = self.pyramid(pair, window, threshold)
+            if not 0 <= level < len(pyramid.levels):
+                raise RequestError(404, 'no such level')
+            rows, cols = pyramid.levels[level][0].shape
+            if not (0 <= row * pyramid.tile < rows and
+                    0 <= col * pyramid.tile < cols):
+                raise RequestError(404, 'no such tile')
+            return dotRaster.png_bytes(pyramid.tile_rgb(level, row, col))
+        return 200, 'image/png', self.cache.get(
+            ('tile',) + pair + (window, threshold, level, row, col), render)
+
+    def get_stats(self, params):
+        return self.json(self.cache.stats())
+
+    @staticmethod
+    def json(value):
+        return 200, 'application/json', json.dumps(value).encode('ascii')
+
+    def handle(self, path, params):
+        """Return (status, content type, body) for a request path and
+        its parse_qs parameters; errors other than RequestErrors are
+        printed and answered with a 500"""
+        route = self.routes.get(path)
+        try:
+            if route is None:
+                raise RequestError(404, 'unknown path: ' + path)
+            return route(params)
+        except RequestError as error:
+            return self.text(error.status, str(error))
+        except Exception as error:
+            traceback.print_exc()
+            return self.text(500, 'internal error: {}: {}'.format(
+                type(error).__name__, error))
+
+    @staticmethod
+    def text(status, message):
+        return status, 'text/plain', (message + '\n').encode('utf-8')
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        status, content_type, body = self.server.dot.handle(
+            url.path, parse_qs(url.query))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return 'local'
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def is_loopback(host):
+    """Return whether every address host resolves to is a loopback one"""
+    try:
+        addresses = {info[4][0] for info in
+                     socket.getaddrinfo(host, None, socket.AF_INET)}
+    except socket.gaierror:
+        return False
+    return bool(addresses) and all(
+        ipaddress.ip_address(address).is_loopback for address in addresses)
+
+
+def make_server(dot, host='127.0.0.1', port=8765, socket_path=None):
+    """Return an HTTP server for the DotServer dot, on host:port or on
+    the Unix socket socket_path. The server has no authentication, so
+    host must be a loopback address; anything else raises ValueError."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = UnixHTTPServer(socket_path, Handler)
+    elif not is_loopback(host):
+        raise ValueError('not a loopback address: ' + repr(host))
+    else:
+        server = ThreadingHTTPServer((host, port), Handler)
+    server.dot = dot
+    return server
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='dotServer.py',
+        description='Serve alignments, BED regions, dot plot points and '
+                    'tiles from memory')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='loopback address to listen on (default: '
+                             '127.0.0.1); other hosts are refused, since '
+                             'anyone reaching the port could read the '
+                             'files under --root')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', metavar='PATH',
+                        help='listen on this Unix socket instead')
+    parser.add_argument('--root', default='.',
+                        help='directory the fasta= files are read from '
+                             '(default: the current directory)')
+    parser.add_argument('--memory', type=int, default=DEFAULT_MEMORY,
+                        metavar='MB',
+                        help='cache budget in megabytes (default: {})'
+                             .format(DEFAULT_MEMORY))
+    args = parser.parse_args(argv)
+    if not args.socket and not is_loopback(args.host):
+        parser.error('--host must be a loopback address such as '
+                     '127.0.0.1 or localhost, not ' + args.host)
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    server = make_server(DotServer(args.root, args.memory), args.host,
+                         args.port, args.socket)
+    print('serving on', args.socket or
+          'http://{}:{}/'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            os.unlink(args.socket)
@@ -0,0 +1,286 @@
+"""Vector export of dot plots without a Tk canvas
+
+Plot.write_postscript asks the Tk canvas to serialize its items, so
+every dot has to exist in Tk first, and it writes grey only. export()
+instead writes the plot's axes, tics, titles and dots straight to a
+PostScript, SVG or PDF file, in colour. The points are read a chunk at
+a time and each chunk is turned into diagonal runs (dotPoints.Segments)
+and written as one path, so memory does not grow with the number of
+points and no display is needed.
+
+    dotVector.export('dotplot.svg', points, window=11,
+                     seqname1='seqA', seqname2='seqB')
+
+The layout follows DotPlot's: the first sequence runs along the x axis
+from the left, the second down the y axis from the top, and the plot
+area is laid out like the PNG written by dotPipeline.write_png.
+"""
+
+import math
+import os
+import zlib
+
+import numpy as np
+
+from dotPoints import Segments, CATEGORY_SLOPES
+from dotRaster import CATEGORY_COLOURS
+
+FORMATS = ('ps', 'svg', 'pdf')
+
+# page layout, in points (one plot pixel is one point)
+LEFT_MARGIN = 24
+RIGHT_MARGIN = 12
+BOTTOM_MARGIN = 20
+TITLE_MARGIN = 6
+TITLE_SIZE = 12
+TITLE_HEIGHT = 18
+AXIS_WIDTH = 3
+TIC_LENGTH = 12
+TIC_SPACING = 100
+
+# segments written per path
+PATH_SEGMENTS = 1000
+
+
+class VectorWriter:
+
+    """Base class of the file writers.
+
+    Coordinates are page units with y = 0 at the top, as on a canvas;
+    page_scale scales the whole page. Subclasses write the header when
+    created and implement write_segments, write_text and close.
+"""
+
+    binary = False
+
+    def __init__(self, filename, width, height, page_scale=1.0):
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.page_scale = page_scale
+        self.fil = open(filename, 'wb' if self.binary else 'w')
+        self.begin()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def begin(self):
+        pass
+
+    def line(self, x1, y1, x2, y2, width=1, colour=(0, 0, 0)):
+        self.write_segments(np.array([x1]), np.array([y1]),
+                            np.array([x2]), np.array([y2]), width, colour)
+
+    def segments(self, x1s, y1s, x2s, y2s, width=1, colour=(0, 0, 0)):
+        """Draw lines from (x1s, y1s) to (x2s, y2s), PATH_SEGMENTS at a
+        time, with square caps"""
+        for start in range(0, len(x1s), PATH_SEGMENTS):
+            stop = start + PATH_SEGMENTS
+            self.write_segments(x1s[start:stop], y1s[start:stop],
+                                x2s[start:stop], y2s[start:stop],
+                                width, colour)
+
+    @staticmethod
+    def rows(template, *columns):
+        """Return template % row for every row of the columns, joined"""
+        values = np.column_stack(columns).astype(np.float64)
+        return (template * len(values)) % tuple(values.ravel().tolist())
+
+
+def ps_string(text):
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(') \
+        .replace(')', '\\)') + ')'
+
+
+class PSWriter(VectorWriter):
+
+    """Encapsulated PostScript"""
+
+    def begin(self):
+        s = self.page_scale
+        self.fil.write('%!PS-Adobe-3.0 EPSF-3.0\n'
+                       '%%BoundingBox: 0 0 {} {}\n'
+                       '%%Title: {}\n'
+                       '%%EndComments\n'
+                       '{} {} scale\n'
+                       '/L {{ moveto lineto }} bind def\n'
+                       '2 setlinecap\n'.format(
+                           math.ceil(self.width * s),
+                           math.ceil(self.height * s),
+                           os.path.basename(self.filename), s, s))
+
+    def write_segments(self, x1s, y1s, x2s, y2s, width, colour):
+        self.fil.write('{:.3f} {:.3f} {:.3f} setrgbcolor {} setlinewidth '
+                       'newpath\n'.format(*(c / 255 for c in colour),
+                                          width))
+        self.fil.write(self.rows('%.2f %.2f %.2f %.2f L\n',
+                                 x2s, self.height - np.asarray(y2s),
+                                 x1s, self.height - np.asarray(y1s)))
+        self.fil.write('stroke\n')
+
+    def write_text(self, x, y, text, size):
+        self.fil.write('0 setgray /Helvetica findfont {} scalefont setfont '
+                       '{:.2f} {:.2f} moveto {} show\n'.format(
+                           size, x, self.height - y, ps_string(text)))
+
+    def close(self):
+        self.fil.write('showpage\n%%EOF\n')
+        self.fil.close()
+
+
+def xml_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;') \
+        .replace('>', '&gt;')
+
+
+class SVGWriter(VectorWriter):
+
+    def begin(self):
+        s = self.page_scale
+        self.fil.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                       '<svg xmlns="http://www.w3.org/2000/svg" '
+                       'width="{:.2f}" height="{:.2f}" '
+                       'viewBox="0 0 {} {}">\n'
+                       '<rect width="100%" height="100%" fill="white"/>\n'
+                       .format(self.width * s, self.height * s,
+                               self.width, self.height))
+
+    def write_segments(self, x1s, y1s, x2s, y2s, width, colour):
+        self.fil.write('<path fill="none" stroke="rgb({},{},{})" '
+                       'stroke-width="{}" stroke-linecap="square" d="'
+                       .format(*colour, width))
+        self.fil.write(self.rows('M%.2f %.2f L%.2f %.2f\n',
+                                 x1s, y1s, x2s, y2s))
+        self.fil.write('"/>\n')
+
+    def write_text(self, x, y, text, size):
+        self.fil.write('<text x="{:.2f}" y="{:.2f}" font-size="{}" '
+                       'font-family="Helvetica, Arial, sans-serif">{}'
+                       '</text>\n'.format(x, y, size, xml_text(text)))
+
+    def close(self):
+        self.fil.write('</svg>\n')
+        self.fil.close()
+
+
+class PDFWriter(VectorWriter):
+
+    """A one-page PDF. The page's content stream is compressed as it is
+    written; its length, which is only known at the end, is written as
+    a separate object after it."""
+
+    binary = True
+
+    def begin(self):
+        s = self.page_scale
+        self.offsets = {}
+        self.fil.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self.write_object(1, '<< /Type /Catalog /Pages 2 0 R >>')
+        self.write_object(2, '<< /Type /Pages /Kids [3 0 R] /Count 1 >>')
+        self.write_object(3, '<< /Type /Page /Parent 2 0 R '
+                             '/MediaBox [0 0 {:.2f} {:.2f}] '
+                             '/Contents 4 0 R '
+                             '/Resources << /Font << /F1 6 0 R >> >> >>'
+                          .format(self.width * s, self.height * s))
+        self.offsets[4] = self.fil.tell()
+        self.fil.write(b'4 0 obj\n<< /Length 5 0 R /Filter /FlateDecode >>'
+                       b'\nstream\n')
+        self.stream_start = self.fil.tell()
+        self.compressor = zlib.compressobj()
+        self.content('{} 0 0 {} 0 0 cm 2 J\n'.format(s, s))
+
+    def write_object(self, number, body):
+        self.offsets[number] = self.fil.tell()
+        self.fil.write('{} 0 obj\n{}\nendobj\n'.format(number, body)
+                       .encode('latin-1'))
+
+    def content(self, text):
+        self.fil.write(self.compressor.compress(text.encode('latin-1')))
+
+    def write_segments(self, x1s, y1s, x2s, y2s, width, colour):
+        self.content('{:.3f} {:.3f} {:.3f} RG {} w\n'.format(
+            *(c / 255 for c in colour), width))
+        self.content(self.rows('%.2f %.2f m %.2f %.2f l\n',
+                               x1s, self.height - np.asarray(y1s),
+                               x2s, self.height - np.asarray(y2s)) + 'S\n')
+
+    def write_text(self, x, y, text, size):
+        self.content('0 g BT /F1 {} Tf {:.2f} {:.2f} Td {} Tj ET\n'.format(
+            size, x, self.height - y, ps_string(text)))
+
+    def close(self):
+        self.fil.write(self.compressor.flush())
+        length = self.fil.tell() - self.stream_start
+        self.fil.write(b'\nendstream\nendobj\n')
+        self.write_object(5, str(length))
+        self.write_object(6, '<< /Type /Font /Subtype /Type1 '
+                             '/BaseFont /Helvetica >>')
+        xref = self.fil.tell()
+        self.fil.write('xref\n0 7\n0000000000 65535 f \n'.encode('latin-1'))
+        for number in range(1, 7):
+            self.fil.write('{:010d} 00000 n \n'.format(self.offsets[number])
+                           .encode('latin-1'))
+        self.fil.write('trailer\n<< /Size 7 /Root 1 0 R >>\nstartxref\n{}\n'
+                       '%%EOF\n'.format(xref).encode('latin-1'))
+        self.fil.close()
+
+
+WRITERS = {'ps': PSWriter, 'eps': PSWriter, 'svg': SVGWriter,
+           'pdf': PDFWriter}
+
+
+def export(filename, points, window, scale=1.0, dot_size=1,
+           seqname1='', seqname2='', page_scale=1.0, format=None,
+           chunk=1 << 16):
+    """Write the dot plot of points to filename as PostScript, SVG or
+    PDF (by default, chosen by the file's extension)"""
+    format = (format or os.path.splitext(filename)[1][1:]).lower()
+    if format not in WRITERS:
+        raise ValueError('unknown vector format: ' + repr(format))
+    titles = (['x = ' + seqname1, 'y = ' + seqname2]
+              if seqname1 and seqname2 else
+              [name for name in (seqname1, seqname2) if name])
+    plot_width = round((points.max_x + window) * scale)
+    plot_height = round((points.max_y + window) * scale)
+    left = LEFT_MARGIN
+    top = TITLE_MARGIN + TITLE_HEIGHT * len(titles)
+    with WRITERS[format](filename,
+                         left + plot_width + RIGHT_MARGIN,
+                         top + plot_height + AXIS_WIDTH + BOTTOM_MARGIN,
+                         page_scale) as out:
+        for n, title in enumerate(titles):
+            out.write_text(left, TITLE_MARGIN + TITLE_HEIGHT * n +
+                           TITLE_SIZE, title, TITLE_SIZE)
+        draw_axes(out, left, top, plot_width, plot_height)
+        half = dot_size / 2
+        for cat in points.categories:
+            slope = CATEGORY_SLOPES[cat]
+            for xs, ys in points.chunks(cat, chunk):
+                xs, ys, lengths = Segments.runs(np.asarray(xs),
+                                                np.asarray(ys), slope)
+                x1s = left + xs * scale + half
+                y1s = top + (ys + window) * scale + half
+                out.segments(x1s, y1s, x1s + (lengths - 1) * scale,
+                             y1s + slope * (lengths - 1) * scale,
+                             dot_size, CATEGORY_COLOURS[cat])
+    print('wrote', filename)
+    return filename
+
+
+def draw_axes(out, left, top, width, height):
+    """Draw the x axis below the plot and the y axis to its left, with
+    a tic every TIC_SPACING points as DotPlot does"""
+    bottom = top + height + AXIS_WIDTH / 2
+    axis_x = left - AXIS_WIDTH / 2
+    out.line(axis_x, bottom, left + width, bottom, AXIS_WIDTH)
+    out.line(axis_x, top, axis_x, bottom, AXIS_WIDTH)
+    tics = np.arange(TIC_SPACING, width + 1, TIC_SPACING)
+    out.segments(left + tics, np.full(len(tics), bottom),
+                 left + tics, np.full(len(tics), bottom + TIC_LENGTH),
+                 AXIS_WIDTH)
+    tics = top + height - np.arange(TIC_SPACING, height + 1, TIC_SPACING)
+    out.segments(np.full(len(tics), axis_x), tics,
+                 np.full(len(tics), axis_x - TIC_LENGTH), tics, AXIS_WIDTH)
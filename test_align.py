@@ -0,0 +1,75 @@
+"""dotAlign's Hirschberg alignment against pairwise2
+
+    python3 -m pytest -q
+
+global_align must find alignments as good as pairwise2's under the
+same linear scoring, including when the problem is split many times
+(FULL_DP_CELLS is lowered so that it is) and when the best alignment
+has gaps at its ends.
+"""
+
+import random
+import warnings
+
+import pytest
+
+import dotAlign
+
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore')     # pairwise2 is deprecated
+    from Bio import pairwise2
+
+SCORINGS = [dotAlign.GLOBALXX, (2, -1, -1), (1, -1, -2), (5, -4, -3)]
+
+
+@pytest.fixture(autouse=True)
+def small_subproblems(monkeypatch):
+    monkeypatch.setattr(dotAlign, 'FULL_DP_CELLS', 12)
+
+
+def pairwise2_score(seqA, seqB, match, mismatch, gap):
+    return pairwise2.align.globalms(seqA, seqB, match, mismatch, gap, gap,
+                                    score_only=True)
+
+
+def check(alignment, seqA, seqB):
+    """The alignment holds seqA and seqB, and scores what it says"""
+    alignedA, alignedB = alignment.alignedA, alignment.alignedB
+    assert len(alignedA) == len(alignedB)
+    assert alignedA.replace('-', '') == seqA
+    assert alignedB.replace('-', '') == seqB
+    assert not any(a == b == '-' for a, b in zip(alignedA, alignedB))
+    assert alignment.score == dotAlign.alignment_score(
+        alignment.a, alignment.b, *alignment.scoring)
+
+
+@pytest.mark.parametrize('scoring', SCORINGS)
+@pytest.mark.parametrize('seed', range(8))
+def test_score_matches_pairwise2(scoring, seed):
+    rng = random.Random(seed)
+    seqA = ''.join(rng.choice('ACGT') for _ in range(rng.randint(1, 60)))
+    seqB = ''.join(ch for ch in seqA if rng.random() < 0.8)
+    seqB += ''.join(rng.choice('ACGT') for _ in range(rng.randint(0, 9)))
+    alignment = dotAlign.global_align(seqA, seqB, *scoring)
+    check(alignment, seqA, seqB)
+    assert alignment.score == pairwise2_score(seqA, seqB, *scoring)
+
+
+@pytest.mark.parametrize('scoring', SCORINGS)
+def test_gaps_at_the_ends(scoring):
+    rng = random.Random(1)
+    core = ''.join(rng.choice('AC') for _ in range(40))
+    seqA = 'GGGGG' + core + 'TTT'
+    alignment = dotAlign.global_align(seqA, core, *scoring)
+    check(alignment, seqA, core)
+    assert alignment.alignedB == '-----' + core + '---'
+    assert alignment.score == pairwise2_score(seqA, core, *scoring)
+    # and the other way round
+    alignment = dotAlign.global_align(core, seqA, *scoring)
+    assert alignment.alignedA == '-----' + core + '---'
+
+
+def test_empty_sequence_is_all_gaps():
+    alignment = dotAlign.global_align('', 'ACG', 1, -1, -2)
+    assert (alignment.alignedA, alignment.alignedB) == ('---', 'ACG')
+    assert alignment.score == -6
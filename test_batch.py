@@ -0,0 +1,27 @@
+"""dotBatch's pair directories and options
+
+    python3 -m pytest -q
+"""
+
+import dotBatch
+import dotEngine
+
+
+def test_pair_directories_are_unique():
+    records = [('strain|0', 'ACGT'), ('strain_0', 'ACGT'),
+               ('Strain_0', 'ACGT')]
+    pairs = dotBatch.schedule_pairs(records, self_pairs=True)
+    names = dotBatch.pair_directories(pairs)
+    assert names[0] == 'strain_0__strain_0'
+    assert names[1] == 'strain_0__strain_0__2'
+    assert len({name.lower() for name in names}) == len(pairs)
+    assert all(name.startswith(dotBatch.safe_name(recordA[0]) + '__')
+               for name, (recordA, _) in zip(names, pairs))
+
+
+def test_options_match_dotplotter():
+    args = dotBatch.parse_args(['x.fa', '9', '11', '7', '--scoring',
+                                '2,-1,-1', '--matrix', 'PAM250'])
+    assert (args.scoring, args.matrix) == ((2, -1, -1), 'PAM250')
+    assert dotBatch.parse_args(['x.fa', '9', '11', '7']).matrix == \
+        dotEngine.MATRIX
@@ -0,0 +1,31 @@
+"""dotBench's measurements
+
+    python3 -m pytest -q
+"""
+
+import tracemalloc
+
+import dotBench
+
+
+def test_memory_is_traced_outside_the_timed_runs():
+    calls = []
+
+    def stage():
+        calls.append(tracemalloc.is_tracing())
+        return bytearray(1 << 20)
+
+    seconds, peak, result = dotBench.measure(stage, 3)
+    assert calls == [False, False, False, True]
+    assert peak >= 1 << 20 and len(result) == 1 << 20 and seconds >= 0
+
+
+def test_every_export_is_timed(tmp_path):
+    rows = dotBench.bench_size(200, 'dna', 0.9, 0.01, 11, 7, ['numpy'],
+                               1, 0, str(tmp_path))
+    assert [(row['stage'], row.get('engine') or row.get('format'))
+            for row in rows] == [
+        ('align', None), ('points', 'numpy'), ('bed', None),
+        ('render', None), ('vector', 'ps'), ('vector', 'svg'),
+        ('vector', 'pdf')]
+    assert len({dotBench.row_key(row) for row in rows}) == len(rows)
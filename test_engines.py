@@ -0,0 +1,220 @@
+"""Every dot plot engine against the reference loop
+
+    python3 -m pytest -q
+
+DotPlot.compute_points_reference is the original cell-by-cell loop;
+each engine must find exactly its points, category by category, on
+seeded random sequences: gap-rich ones, ones of different lengths and
+windows longer than a sequence.
+"""
+
+import random
+
+import pytest
+
+import dotEngine
+from ch11_dotplot import DotPlot
+
+# (length of seq1, length of seq2, window, threshold)
+CASES = [(60, 50, 11, 7), (50, 60, 3, 2), (40, 40, 1, 1),
+         (70, 65, 5, 5), (30, 45, 8, 0), (4, 30, 6, 3),
+         (25, 3, 5, 1), (2, 2, 9, 1), (130, 70, 66, 20)]
+ALPHABETS = ['ACGT', 'ACGT--', 'AC-N']
+
+
+def random_pair(len1, len2, alphabet, seed):
+    """Return two related sequences: seq2 is seq1 with substitutions,
+    and both are padded or cut to their lengths"""
+    rng = random.Random(seed)
+    seq1 = ''.join(rng.choice(alphabet) for _ in range(len1))
+    seq2 = ''.join(ch if rng.random() < 0.7 else rng.choice(alphabet)
+                   for ch in seq1[:len2])
+    seq2 += ''.join(rng.choice(alphabet) for _ in range(len2 - len(seq2)))
+    return seq1, seq2
+
+
+def reference(seq1, seq2, window, threshold, both_strands=False):
+    """Return the reference loop's points, without opening a window"""
+    plot = DotPlot.__new__(DotPlot)
+    plot.seq1, plot.seq2 = seq1, seq2
+    plot.window, plot.threshold = window, threshold
+    plot.both_strands = both_strands
+    return plot.compute_points_reference()
+
+
+def point_sets(points):
+    """Return {category: set of (x, y)} of a PointSet"""
+    return {cat: set(zip(points.xs(cat).tolist(), points.ys(cat).tolist()))
+            for cat in points.categories}
+
+
+def merged(batches):
+    """Return the point_sets of the PointSets of point_batches"""
+    sets = {}
+    for _, points in batches:
+        for cat, pairs in point_sets(points).items():
+            sets.setdefault(cat, set()).update(pairs)
+    return sets
+
+
+ENGINES = {
+    'numpy': dotEngine.window_points,
+    'seeded': lambda *args: dotEngine.seeded_points(*args, kmer_cap=None),
+    'seeded-capped': lambda *args: dotEngine.seeded_points(*args,
+                                                           kmer_cap=2),
+    'tiled': lambda *args: dotEngine.tiled_points(*args, tile=7),
+    'indexed': lambda *args: dotEngine.DiagonalIndex(
+        *args[:2]).points(*args[2:]),
+    'parallel': lambda *args: dotEngine.parallel_points(*args, jobs=2),
+    'packed': dotEngine.packed_points,
+}
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    """Cut the blocked engines' work into many small blocks, so that
+    the edges between blocks are crossed"""
+    monkeypatch.setattr(dotEngine, 'QUERY_CELLS', 97)
+    monkeypatch.setattr(dotEngine, 'PACKED_BLOCK_WORDS', 3)
+
+
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+@pytest.mark.parametrize('alphabet', ALPHABETS)
+@pytest.mark.parametrize('case', CASES)
+def test_engine_matches_reference(engine, alphabet, case):
+    len1, len2, window, threshold = case
+    if engine == 'parallel' and case != CASES[0]:
+        pytest.skip('one case is enough to start a pool')
+    seq1, seq2 = random_pair(len1, len2, alphabet, seed=len1 * len2)
+    expected = point_sets(reference(seq1, seq2, window, threshold))
+    found = ENGINES[engine](seq1, seq2, window, threshold)
+    assert point_sets(found) == expected
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_point_batches_match_reference(case):
+    len1, len2, window, threshold = case
+    seq1, seq2 = random_pair(len1, len2, 'ACGT--', seed=len1 + len2)
+    batches = dotEngine.point_batches(seq1, seq2, window, threshold,
+                                      batch_windows=50)
+    assert merged(batches) == point_sets(
+        reference(seq1, seq2, window, threshold))
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_both_strands_match_reference(case):
+    len1, len2, window, threshold = case
+    seq1, seq2 = random_pair(len1, len2, 'ACGTN', seed=len1 - len2)
+    expected = point_sets(reference(seq1, seq2, window, threshold, True))
+    assert point_sets(dotEngine.window_points(
+        seq1, seq2, window, threshold, both_strands=True)) == expected
+    assert merged(dotEngine.point_batches(
+        seq1, seq2, window, threshold, both_strands=True,
+        batch_windows=50)) == expected
+
+
+def test_index_answers_every_setting():
+    seq1, seq2 = random_pair(80, 70, 'ACGT-', seed=1)
+    index = dotEngine.DiagonalIndex(seq1, seq2)
+    for window in (1, 4, 11, 75, 90):
+        for threshold in range(0, min(window, 12) + 2, 3):
+            assert point_sets(index.points(window, threshold)) == \
+                point_sets(reference(seq1, seq2, window, threshold))
+
+
+def test_seeded_matches_numpy_on_long_input():
+    """At w=11/t=7 the seeds are 2-mers, which pass kmer_cap on long
+    inputs; the points must still all be found"""
+    seq1, seq2 = random_pair(20000, 20000, 'ACGT', seed=20)
+    stats = {}
+    found = dotEngine.seeded_points(seq1, seq2, 11, 7, stats=stats)
+    assert stats['masked'] and stats['fallback']
+    assert point_sets(found) == point_sets(
+        dotEngine.window_points(seq1, seq2, 11, 7))
+
+
+def test_seeded_seeds_selective_windows():
+    seq1, seq2 = random_pair(3000, 3000, 'ACGT', seed=21)
+    stats = {}
+    found = dotEngine.seeded_points(seq1, seq2, 20, 18, stats=stats)
+    assert stats['k'] == 6 and stats['fallback'] is None
+    assert point_sets(found) == point_sets(
+        dotEngine.window_points(seq1, seq2, 20, 18))
+
+
+def within(sets, lo, hi):
+    """Return point_sets restricted to the diagonals lo..hi"""
+    return {cat: {(x, y) for x, y in pairs if lo <= x - y <= hi}
+            for cat, pairs in sets.items()}
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_banded_matches_reference_within_its_band(case):
+    len1, len2, window, threshold = case
+    seq1, seq2 = random_pair(len1, len2, 'ACGT-', seed=len1 + 3)
+    expected = point_sets(reference(seq1, seq2, window, threshold))
+    stats = {}
+    found = point_sets(dotEngine.banded_points(seq1, seq2, window,
+                                               threshold, stats=stats))
+    assert found == within(expected, stats['lo'], stats['hi'])
+    wide = dotEngine.banded_points(seq1, seq2, window, threshold,
+                                   band=len1 + len2)
+    assert point_sets(wide) == expected
+
+
+def test_banded_stays_narrow_on_background():
+    seq1, seq2 = random_pair(3000, 3000, 'ACGT', seed=30)
+    for window, threshold in ((11, 7), (3, 2)):
+        stats = {}
+        dotEngine.banded_points(seq1, seq2, window, threshold,
+                                stats=stats)
+        assert (stats['lo'], stats['hi']) == (-window, window)
+
+
+def test_banded_widens_for_repeats_at_its_edge():
+    """A tandem repeat of period 8 puts hits on every 8th diagonal,
+    starting at the edge of the default band (window 11: band 11)"""
+    unit = random_pair(8, 0, 'ACGT', seed=31)[0]
+    seq = unit * 40
+    stats = {}
+    found = dotEngine.banded_points(seq, seq, 11, 9, stats=stats)
+    # all but the corners, where diagonals are too short to stand out
+    assert stats['lo'] < -len(seq) + 30 and stats['hi'] > len(seq) - 30
+    assert point_sets(found) == within(point_sets(
+        dotEngine.window_points(seq, seq, 11, 9)), stats['lo'], stats['hi'])
+
+
+def naive_scored(seq1, seq2, window, threshold, matrix):
+    """Return the scored engine's point_sets, scoring every window
+    residue by residue from the Biopython matrix"""
+    from Bio.Align import substitution_matrices
+    scores = substitution_matrices.load(matrix)
+    lowest = min(min(row) for row in scores)
+
+    def score(ch1, ch2):
+        if ch1 in scores.alphabet and ch2 in scores.alphabet:
+            return scores[ch1][ch2]
+        return lowest
+
+    sets = {dotEngine.MATCH: set(), dotEngine.GAP_MATCH: set()}
+    for x in range(len(seq1) - window + 1):
+        for y in range(len(seq2) - window + 1):
+            if sum(score(seq1[x + i], seq2[y + i])
+                   for i in range(window)) >= threshold:
+                cat = (dotEngine.GAP_MATCH if seq2[y] == '-'
+                       else dotEngine.MATCH)
+                sets[cat].add((x, y))
+    return sets
+
+
+@pytest.mark.parametrize('matrix', ['BLOSUM62', 'PAM250'])
+@pytest.mark.parametrize('window, threshold', [(3, 5), (5, 8), (1, 4)])
+def test_scored_matches_naive_scorer(matrix, window, threshold):
+    seq1, seq2 = random_pair(45, 38, 'ACDEFGHIKLMNPQRSTVWY-',
+                             seed=window * threshold)
+    found = point_sets(dotEngine.compute_points(
+        seq1, seq2, window, threshold, 'scored', matrix=matrix))
+    expected = naive_scored(seq1, seq2, window, threshold, matrix)
+    assert {cat: pairs for cat, pairs in found.items() if pairs} == \
+        {cat: pairs for cat, pairs in expected.items() if pairs}
+    assert found[dotEngine.MATCH]
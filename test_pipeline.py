@@ -0,0 +1,123 @@
+"""The headless pipeline stages' output files
+
+    python3 -m pytest -q
+"""
+
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+import dotEngine
+import dotFasta
+import dotPipeline
+import dotRaster
+from test_engines import random_pair
+
+
+def read_png(filename):
+    """Return (width, height, RGB array) of a PNG written by dotRaster,
+    checking every chunk's CRC"""
+    with open(filename, 'rb') as fil:
+        data = fil.read()
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    pos, chunks = 8, []
+    while pos < len(data):
+        length, = struct.unpack('>I', data[pos:pos + 4])
+        tag, body = data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]
+        crc, = struct.unpack('>I', data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(tag + body) & 0xffffffff
+        chunks.append((tag, body))
+        pos += 12 + length
+    assert chunks[0][0] == b'IHDR' and chunks[-1] == (b'IEND', b'')
+    width, height = struct.unpack('>II', chunks[0][1][:8])
+    rows = zlib.decompress(b''.join(body for tag, body in chunks
+                                    if tag == b'IDAT'))
+    rows = np.frombuffer(rows, dtype=np.uint8).reshape(height, -1)
+    assert not rows[:, 0].any()                     # filter type 0
+    return width, height, rows[:, 1:].reshape(height, width, 3)
+
+
+def test_png_bands_decode_to_the_image(tmp_path):
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 5, size=(70, 45), dtype=np.uint8)
+    filename = str(tmp_path / 'bands.png')
+    dotRaster.write_pixels_png(filename, pixels, band_rows=16)
+    width, height, rgb = read_png(filename)
+    assert (width, height) == (45, 70)
+    assert (rgb == dotRaster.colourize(pixels)).all()
+
+
+def test_headless_png_is_capped_and_max_pooled(tmp_path):
+    seq1, seq2 = random_pair(300, 260, 'ACGT-', seed=5)
+    points = dotEngine.window_points(seq1, seq2, 5, 3)
+    filename = str(tmp_path / 'dotplot.png')
+    dotPipeline.write_png(points, 5, filename, max_side=64)
+    width, height, rgb = read_png(filename)
+    assert max(width, height) == 64
+    scale = 64 / (max(points.max_x, points.max_y) + 5)
+    expected = dotRaster.rasterize(points, width, height, scale,
+                                   y_offset=5)
+    assert (rgb == dotRaster.colourize(expected)).all()
+    # the highest category on a pixel wins, and none is lost entirely
+    found = {cat for cat in points.categories if len(points.xs(cat))}
+    assert set(np.unique(expected)) == {0} | {cat + 1 for cat in found}
+
+
+FASTA = ('>chr1 first\nACGTACGTAC\nGTACGTTTGA\nCCAGT\n'
+         '>chr2\nACGTACGTACGTACGTTTGACCAGT\n')
+
+
+def test_regions_keep_record_coordinates(tmp_path):
+    filename = str(tmp_path / 'pair.fa')
+    with open(filename, 'w') as fil:
+        fil.write(FASTA)
+    pair = dotPipeline.read_fasta_pair(filename, ['chr1:3-14', 'chr2:5'])
+    assert pair == ('chr1', b'GTACGTACGTAC', 'chr2',
+                    b'ACGTACGTACGTTTGACCAGT', 2, 4)
+    records = dict(zip(('chr1', 'chr2'), dotPipeline.read_fasta_pair(
+        filename, ['chr1', 'chr2'])[1:4:2]))
+    alignment = dotPipeline.align(pair.seqA, pair.seqB, idA=pair.idA,
+                                  idB=pair.idB, startA=pair.startA,
+                                  startB=pair.startB)
+    lines = dotPipeline.alignment_bed_lines(alignment, 1)
+    assert lines
+    for line in lines:
+        chrom, start, end = line.split('\t')[:3]
+        # each interval is the residues of the record aligned to a gap
+        residues = records[chrom][int(start):int(end)]
+        aligned = alignment.b if chrom == 'chr2' else alignment.a
+        aln = line.split('\t')[3].split(';aln:')[1].split('-')
+        assert residues == aligned[int(aln[0]):int(aln[1])].tobytes()
+    with pytest.raises(dotFasta.UnknownSequence):
+        dotPipeline.read_fasta_pair(filename, ['chr3'])
+
+
+def encoded(aligned):
+    return np.frombuffer(aligned.encode('ascii'), dtype=np.uint8)
+
+
+def test_bed_lines_are_bed6_in_sequence_coordinates():
+    alignedA, alignedB = '--AC-GT---A', 'TTACGG-CCAA'
+    lines = dotPipeline.bed_lines('seqA', 'seqB', encoded(alignedA),
+                                  encoded(alignedB), 1)
+    fields = [line.rstrip('\n').split('\t') for line in lines]
+    assert all(len(row) == 6 for row in fields)
+    assert all(line.endswith('\n') and line.count('\n') == 1
+               for line in lines)
+    # chromStart and chromEnd are 0-based, half-open, in ungapped seqB
+    assert [(row[0], int(row[1]), int(row[2])) for row in fields] == \
+        [('seqB', 0, 2), ('seqB', 4, 5), ('seqB', 6, 9)]
+    seqB = alignedB.replace('-', '')
+    assert [seqB[int(row[1]):int(row[2])] for row in fields] == \
+        ['TT', 'G', 'CCA']
+    # the name gives the gap's position in ungapped seqA and its columns
+    assert [row[3] for row in fields] == \
+        ['seqA:0;aln:0-2', 'seqA:2;aln:4-5', 'seqA:4;aln:7-10']
+    assert all(row[4] == '0' and row[5] == '.' for row in fields)
+    # size drops shorter runs, the header names the six columns
+    assert len(dotPipeline.bed_lines('seqA', 'seqB', encoded(alignedA),
+                                     encoded(alignedB), 2)) == 2
+    assert dotPipeline.BED_HEADER.lstrip('#').split('\t') == \
+        ['chrom', 'chromStart', 'chromEnd', 'name', 'score', 'strand\n']
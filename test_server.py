@@ -0,0 +1,151 @@
+"""dotServer's routes, error codes and cache
+
+    python3 -m pytest -q
+
+Requests go through DotServer.handle(), and once over HTTP on an
+ephemeral localhost port.
+"""
+
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.parse import parse_qs
+from urllib.request import urlopen
+
+import pytest
+
+import dotEngine
+import dotServer
+from test_engines import point_sets, random_pair
+
+
+@pytest.fixture
+def dot(tmp_path):
+    """A server on a directory holding pair.fa, next to outside.fa"""
+    seq1, seq2 = random_pair(300, 280, 'ACGT', seed=3)
+    (tmp_path / 'served').mkdir()
+    for filename in ('served/pair.fa', 'outside.fa'):
+        with open(str(tmp_path / filename), 'w') as fil:
+            fil.write('>seqA\n{}\n>seqB\n{}\n'.format(seq1, seq2))
+    return dotServer.DotServer(str(tmp_path / 'served'), memory=16)
+
+
+def get(dot, path, query=''):
+    status, content_type, body = dot.handle(path, parse_qs(query))
+    if content_type == 'application/json':
+        body = json.loads(body)
+    return status, body
+
+
+PAIR = 'fasta=pair.fa'
+
+
+def test_routes(dot):
+    status, body = get(dot, '/align', PAIR)
+    assert status == 200 and (body['idA'], body['idB']) == ('seqA', 'seqB')
+    assert len(body['alignedA']) == len(body['alignedB']) == body['length']
+    status, bed = get(dot, '/bed', PAIR + '&indel_size=1')
+    assert status == 200 and bed.startswith(b'#chrom\t')
+    assert all(len(line.split(b'\t')) == 6
+               for line in bed.splitlines()[1:])
+    status, body = get(dot, '/points', PAIR + '&window=11&threshold=7')
+    aligned = get(dot, '/align', PAIR)[1]
+    expected = dotEngine.window_points(aligned['alignedA'],
+                                       aligned['alignedB'], 11, 7)
+    assert status == 200
+    assert {name: set(zip(xy['x'], xy['y']))
+            for name, xy in body['points'].items()} == \
+        {dotServer.CATEGORY_NAMES[cat]: pairs
+         for cat, pairs in point_sets(expected).items()}
+    status, body = get(dot, '/pyramid', PAIR + '&window=11&threshold=7')
+    assert status == 200 and body['levels'][0] == [
+        body['height'], body['width']]
+    status, tile = get(dot, '/tile', PAIR +
+                       '&window=11&threshold=7&level=0&row=0&col=0')
+    assert status == 200 and tile.startswith(b'\x89PNG\r\n\x1a\n')
+    status, stats = get(dot, '/stats')
+    assert status == 200 and stats['hits'] > 0 and stats['misses'] > 0
+
+
+@pytest.mark.parametrize('path, query, status', [
+    ('/nowhere', PAIR, 404),
+    ('/align', '', 400),                                # no fasta=
+    ('/align', 'fasta=../outside.fa', 403),             # outside --root
+    ('/align', 'fasta=missing.fa', 404),
+    ('/align', PAIR + '&scoring=1,0', 400),
+    ('/align', PAIR + '&region=seqC', 404),
+    ('/align', PAIR + '&region=seqA:0-9', 400),
+    ('/points', PAIR + '&threshold=7', 400),            # no window=
+    ('/points', PAIR + '&window=0&threshold=7', 400),
+    ('/points', PAIR + '&window=x&threshold=7', 400),
+    ('/tile', PAIR + '&window=11&threshold=7&level=9&row=0&col=0', 404),
+    ('/tile', PAIR + '&window=11&threshold=7&level=0&row=5&col=0', 404),
+])
+def test_errors(dot, path, query, status):
+    answer, content_type, body = dot.handle(path, parse_qs(query))
+    assert (answer, content_type) == (status, 'text/plain')
+    assert body.endswith(b'\n')
+
+
+def test_cache_evicts_least_recently_used():
+    cache = dotServer.LRUCache(100)
+    computed = []
+
+    def value(key, size):
+        def compute():
+            computed.append(key)
+            return b'x' * size
+        return compute
+
+    cache.get('a', value('a', 40))
+    cache.get('b', value('b', 40))
+    cache.get('a', value('a', 40))          # a is now the most recent
+    cache.get('c', value('c', 40))          # so b is dropped
+    assert list(cache.entries) == ['a', 'c'] and cache.used == 80
+    cache.get('b', value('b', 40))
+    assert computed == ['a', 'b', 'c', 'b']
+    assert cache.get('big', value('big', 101)) == b'x' * 101
+    assert 'big' not in cache.entries       # larger than the budget
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 5, 2)
+    assert stats['used_bytes'] <= stats['budget_bytes']
+
+
+def test_server_stays_within_its_budget(dot):
+    dot.cache = dotServer.LRUCache(200000)
+    for window in (5, 7, 9, 11, 13):
+        assert get(dot, '/points', PAIR + '&window={}&threshold=4'
+                   .format(window))[0] == 200
+        stats = get(dot, '/stats')[1]
+        assert stats['used_bytes'] <= stats['budget_bytes']
+    assert stats['evictions'] > 0
+    assert get(dot, '/align', PAIR)[0] == 200
+
+
+def test_http(dot):
+    server = dotServer.make_server(dot, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+        with urlopen(url + '/align?' + PAIR) as response:
+            assert response.headers['Content-Type'] == 'application/json'
+            assert json.load(response)['idA'] == 'seqA'
+        with pytest.raises(HTTPError) as error:
+            urlopen(url + '/points?' + PAIR + '&window=0&threshold=1')
+        assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_only_loopback_hosts():
+    assert dotServer.is_loopback('127.0.0.1')
+    assert dotServer.is_loopback('localhost')
+    assert not dotServer.is_loopback('0.0.0.0')
+    assert not dotServer.is_loopback('192.0.2.1')
+    with pytest.raises(ValueError):
+        dotServer.make_server(dotServer.DotServer(), '0.0.0.0', 0)
+    with pytest.raises(SystemExit):
+        dotServer.parse_args(['--host', '0.0.0.0'])
+    assert dotServer.parse_args(['--host', 'localhost']).host == 'localhost'
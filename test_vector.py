@@ -0,0 +1,97 @@
+"""dotVector's PostScript, SVG and PDF files
+
+    python3 -m pytest -q
+
+Each file is read back: the SVG is parsed as XML and its dot paths
+must cover every point, the PDF's cross-reference table and stream
+length must be right, and the PostScript must start with a valid EPS
+header whose bounding box is the page.
+"""
+
+import re
+import xml.etree.ElementTree as ElementTree
+import zlib
+
+import pytest
+
+import dotEngine
+import dotVector
+from test_engines import random_pair
+
+WINDOW = 5
+
+
+@pytest.fixture(scope='module')
+def points():
+    seq1, seq2 = random_pair(230, 180, 'ACGT-', seed=7)
+    return dotEngine.window_points(seq1, seq2, WINDOW, 3,
+                                   both_strands=True)
+
+
+def export(tmp_path, points, format, **options):
+    filename = str(tmp_path / ('dotplot.' + format))
+    dotVector.export(filename, points, WINDOW, seqname1='seqA',
+                     seqname2='seq<B>', chunk=101, **options)
+    return filename
+
+
+def test_svg_is_well_formed_and_draws_every_point(tmp_path, points):
+    root = ElementTree.parse(export(tmp_path, points, 'svg')).getroot()
+    ns = '{http://www.w3.org/2000/svg}'
+    assert root.tag == ns + 'svg'
+    _, _, width, height = map(float, root.get('viewBox').split())
+    assert [text.text for text in root.iter(ns + 'text')] == \
+        ['x = seqA', 'y = seq<B>']
+    colours = {'rgb({},{},{})'.format(*colour): cat
+               for cat, colour in enumerate(dotVector.CATEGORY_COLOURS)}
+    drawn = [0] * len(dotVector.CATEGORY_COLOURS)
+    for path in root.iter(ns + 'path'):
+        coords = [float(value) for value in
+                  re.findall(r'[-\d.]+', path.get('d'))]
+        assert all(0 <= x <= width for x in coords[0::2])
+        assert all(0 <= y <= height for y in coords[1::2])
+        if path.get('stroke-width') != '1':
+            continue                                # the axes
+        for x1, x2 in zip(coords[0::4], coords[2::4]):
+            drawn[colours[path.get('stroke')]] += round(abs(x2 - x1)) + 1
+    assert drawn == [points.count(cat) for cat in points.categories]
+
+
+def test_pdf_cross_references_and_stream(tmp_path, points):
+    with open(export(tmp_path, points, 'pdf', page_scale=0.5), 'rb') as fil:
+        data = fil.read()
+    assert data.startswith(b'%PDF-1.4\n') and data.endswith(b'%%EOF\n')
+    startxref = int(data.rsplit(b'startxref\n', 1)[1].split()[0])
+    assert data[startxref:].startswith(b'xref\n0 7\n')
+    entries = data[startxref:].split(b'\n')[3:9]
+    for number, entry in enumerate(entries, 1):
+        offset = int(entry.split()[0])
+        assert data[offset:].startswith(b'%d 0 obj\n' % number)
+    stream = data.index(b'stream\n') + len(b'stream\n')
+    end = data.index(b'\nendstream')
+    length = int(re.search(rb'5 0 obj\n(\d+)\n', data).group(1))
+    assert end - stream == length
+    content = zlib.decompress(data[stream:end]).decode('latin-1')
+    assert content.startswith('0.5 0 0 0.5 0 0 cm')
+    assert content.count(' m ') == content.count(' l\n')
+    assert b'/MediaBox' in data and b'/FlateDecode' in data
+
+
+def test_postscript_header(tmp_path, points):
+    with open(export(tmp_path, points, 'ps')) as fil:
+        lines = fil.read().split('\n')
+    assert lines[0] == '%!PS-Adobe-3.0 EPSF-3.0'
+    box = lines[1].split()
+    assert box[0] == '%%BoundingBox:' and box[1:3] == ['0', '0']
+    width, height = int(box[3]), int(box[4])
+    assert width > (points.max_x + WINDOW) and \
+        height > (points.max_y + WINDOW)
+    assert lines[2] == '%%Title: dotplot.ps'
+    assert '%%EndComments' in lines[:6]
+    assert lines[-3:] == ['showpage', '%%EOF', '']
+    assert '(y = seq<B>) show' in '\n'.join(lines)
+
+
+def test_unknown_format(tmp_path, points):
+    with pytest.raises(ValueError):
+        export(tmp_path, points, 'gif')